@@ -1,13 +1,14 @@
 #!/usr/bin/env python3
 """
 Load testing script for rmbg-service.
-Sends 100 requests with test.jpg using 10 concurrent workers and tracks task completion status.
+Sends 100 requests with test.jpg in batches of 10 using 10 concurrent workers and tracks task completion status.
 """
 
 import asyncio
 import aiohttp
 import time
-import json
+import orjson
+import random
 from collections import Counter, defaultdict
 from datetime import datetime
 import os
@@ -16,8 +17,16 @@ from typing import Dict, List, Any
 # Configuration
 TOTAL_REQUESTS = 100
 CONCURRENCY = 10
+BATCH_SIZE = 10  # Images per submit request; 1 uses the single-task endpoint
 IMAGE_PATH = "test.jpg"
 API_URL = "http://localhost:8000"  # Change this to your API URL if different
+POLL_INITIAL_DELAY = 0.1  # First retry delay in seconds after a server error
+POLL_MAX_DELAY = 5.0  # Cap for the exponential retry backoff
+POLL_TIMEOUT = 600  # Give up on a task after this many seconds
+STREAM_READ_TIMEOUT = 60  # Max seconds between events on a status stream
+
+# Bound the number of in-flight submissions independently of the worker count
+SUBMIT_SEM = asyncio.Semaphore(CONCURRENCY)
 
 # Statistics
 task_statuses = {}
@@ -25,114 +34,191 @@ processing_times = defaultdict(list)
 start_time = None
 end_time = None
 
-async def submit_task(session: aiohttp.ClientSession, request_id: int) -> Dict[str, Any]:
+def build_file_payload(file_bytes: bytes, field_name: str) -> aiohttp.BytesPayload:
+    """Wrap the image bytes once as a multipart file part that every request reuses."""
+    payload = aiohttp.BytesPayload(memoryview(file_bytes), content_type='image/jpeg')
+    payload.set_content_disposition('form-data', name=field_name, filename='test.jpg')
+    return payload
+
+def build_form_data(file_payloads: List[aiohttp.Payload], request_data: Dict[str, Any]) -> aiohttp.MultipartWriter:
+    """Build a multipart form with the given file parts and request data."""
+    form_data = aiohttp.MultipartWriter('form-data')
+    for file_payload in file_payloads:
+        form_data.append_payload(file_payload)
+    part = form_data.append(orjson.dumps(request_data).decode())
+    part.set_content_disposition('form-data', name='request_data')
+    return form_data
+
+async def submit_task(session: aiohttp.ClientSession, request_id: int, file_payload: aiohttp.Payload) -> Dict[str, Any]:
     """Submit a task to remove background from an image."""
     url = f"{API_URL}/task"
     
-    # Prepare the file for upload
-    with open(IMAGE_PATH, "rb") as f:
-        file_data = f.read()
-    
-    # Create form data with the image file
-    form_data = aiohttp.FormData()
-    form_data.add_field('file', 
-                        file_data, 
-                        filename='test.jpg', 
-                        content_type='image/jpeg')
-    
     # Optional request data
     request_data = {
         "custom_data": {
             "request_id": request_id
         }
     }
-    form_data.add_field('request_data', json.dumps(request_data))
+    
+    # Create form data with the image file
+    form_data = build_form_data([file_payload], request_data)
     
     # Submit the task
-    task_start_time = time.time()
-    async with session.post(url, data=form_data) as response:
-        if response.status != 202:
-            print(f"Request {request_id} failed with status {response.status}")
-            return {"request_id": request_id, "error": f"HTTP {response.status}"}
+    async with SUBMIT_SEM:
+        task_start_time = asyncio.get_running_loop().time()
+        async with session.post(url, data=form_data) as response:
+            if response.status != 202:
+                print(f"Request {request_id} failed with status {response.status}")
+                return {"request_id": request_id, "error": f"HTTP {response.status}"}
         
-        result = await response.json()
-        task_id = result.get("task_id")
-        if not task_id:
-            return {"request_id": request_id, "error": "No task_id in response"}
+            result = await response.json(loads=orjson.loads)
+            task_id = result.get("task_id")
+            if not task_id:
+                return {"request_id": request_id, "error": "No task_id in response"}
         
-        return {
-            "request_id": request_id,
-            "task_id": task_id,
-            "submit_time": task_start_time
+            return {
+                "request_id": request_id,
+                "task_id": task_id,
+                "submit_time": task_start_time
+            }
+
+async def submit_batch(session: aiohttp.ClientSession, request_ids: List[int], file_payload: aiohttp.Payload) -> List[Dict[str, Any]]:
+    """Submit several tasks to remove background in a single request."""
+    url = f"{API_URL}/tasks"
+    
+    # Optional request data, shared by every task in the batch
+    request_data = {
+        "custom_data": {
+            "request_ids": request_ids
         }
+    }
+    
+    # Create form data with one image file per request
+    form_data = build_form_data([file_payload] * len(request_ids), request_data)
+    
+    # Submit the batch
+    async with SUBMIT_SEM:
+        task_start_time = asyncio.get_running_loop().time()
+        async with session.post(url, data=form_data) as response:
+            if response.status != 202:
+                print(f"Batch {request_ids[0]}-{request_ids[-1]} failed with status {response.status}")
+                return [{"request_id": request_id, "error": f"HTTP {response.status}"} for request_id in request_ids]
+        
+            result = await response.json(loads=orjson.loads)
+            task_ids = result.get("task_ids") or []
+            if len(task_ids) != len(request_ids):
+                return [{"request_id": request_id, "error": "Missing task_ids in response"} for request_id in request_ids]
+        
+            return [
+                {
+                    "request_id": request_id,
+                    "task_id": task_id,
+                    "submit_time": task_start_time
+                }
+                for request_id, task_id in zip(request_ids, task_ids)
+            ]
 
 async def check_task_status(session: aiohttp.ClientSession, task_info: Dict[str, Any]) -> Dict[str, Any]:
-    """Check the status of a task."""
+    """Follow a task's server-sent event stream until it finishes."""
     task_id = task_info["task_id"]
-    url = f"{API_URL}/task/{task_id}"
+    url = f"{API_URL}/task/{task_id}/stream"
     
-    # Poll until the task is completed or failed
-    while True:
-        async with session.get(url) as response:
-            if response.status != 200:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + POLL_TIMEOUT
+    retry_delay = POLL_INITIAL_DELAY
+    
+    # The stream stays open for the whole task, so only bound the gap between events
+    timeout = aiohttp.ClientTimeout(total=POLL_TIMEOUT, sock_read=STREAM_READ_TIMEOUT)
+    
+    # Reconnect if the stream ends before the task is completed or failed
+    while loop.time() < deadline:
+        async with session.get(url, timeout=timeout) as response:
+            if response.status >= 500:
+                # Treat server errors as transient and retry with backoff
+                await asyncio.sleep(retry_delay + random.uniform(0, retry_delay * 0.1))
+                retry_delay = min(retry_delay * 2, POLL_MAX_DELAY)
+                continue
+            elif response.status != 200:
                 return {**task_info, "status": "error", "error": f"HTTP {response.status}"}
             
-            result = await response.json()
-            status = result.get("status")
-            
-            if status in ["completed", "failed"]:  # Update status check condition to use lowercase values
-                end_time = time.time()
-                processing_time = end_time - task_info["submit_time"]
+            retry_delay = POLL_INITIAL_DELAY
+            async for line in response.content:
+                if not line.startswith(b"data:"):
+                    continue
                 
-                return {
-                    **task_info,
-                    "status": status,
-                    "processing_time": processing_time,
-                    "result": result
-                }
-            
-            # Wait before polling again
-            await asyncio.sleep(0.5)
+                result = orjson.loads(line[5:])
+                status = result.get("status")
+                
+                if status in ["completed", "failed"]:  # Update status check condition to use lowercase values
+                    end_time = loop.time()
+                    processing_time = end_time - task_info["submit_time"]
+                    
+                    return {
+                        **task_info,
+                        "status": status,
+                        "processing_time": processing_time,
+                        "result": result
+                    }
+    
+    return {**task_info, "status": "error", "error": f"Timed out after {POLL_TIMEOUT}s"}
 
-async def process_request(session: aiohttp.ClientSession, request_id: int) -> Dict[str, Any]:
-    """Process a single request from submission to completion."""
+async def process_request(session: aiohttp.ClientSession, request_ids: List[int], file_payloads: Dict[str, aiohttp.Payload]) -> List[Dict[str, Any]]:
+    """Process a batch of requests from submission to completion."""
     try:
-        # Submit the task
-        task_info = await submit_task(session, request_id)
-        if "error" in task_info:
-            return task_info
+        # Submit the tasks, /task expects a "file" field and /tasks "files"
+        if len(request_ids) == 1:
+            task_infos = [await submit_task(session, request_ids[0], file_payloads["file"])]
+        else:
+            task_infos = await submit_batch(session, request_ids, file_payloads["files"])
         
-        # Check the task status until completion
-        result = await check_task_status(session, task_info)
-        return result
+        # Check the task statuses until completion
+        # A stream that fails only marks its own request as an error
+        failed = [task_info for task_info in task_infos if "error" in task_info]
+        pending = [task_info for task_info in task_infos if "error" not in task_info]
+        results = await asyncio.gather(*(
+            check_task_status(session, task_info)
+            for task_info in pending
+        ), return_exceptions=True)
+        return failed + [
+            {**task_info, "status": "error", "error": str(result)} if isinstance(result, Exception) else result
+            for task_info, result in zip(pending, results)
+        ]
     except Exception as e:
-        return {"request_id": request_id, "status": "error", "error": str(e)}
+        return [{"request_id": request_id, "status": "error", "error": str(e)} for request_id in request_ids]
 
-async def worker(queue: asyncio.Queue, session: aiohttp.ClientSession) -> None:
+async def worker(queue: asyncio.Queue, session: aiohttp.ClientSession, file_payloads: Dict[str, aiohttp.Payload]) -> None:
     """Worker that processes requests from the queue."""
     while True:
-        request_id = await queue.get()
-        result = await process_request(session, request_id)
-        
-        # Store the result
-        task_statuses[request_id] = result
-        
-        # Store processing time for statistics
-        if "processing_time" in result:
-            status = result.get("status", "unknown")
-            processing_times[status].append(result["processing_time"])
+        request_ids = await queue.get()
+        results = await process_request(session, request_ids, file_payloads)
         
-        # Print progress
-        completed = len(task_statuses)
-        print(f"Completed {completed}/{TOTAL_REQUESTS} requests. Latest: Request {request_id} - {result.get('status', 'unknown')}")
+        for result in results:
+            request_id = result["request_id"]
+            
+            # Store the result
+            task_statuses[request_id] = result
+            
+            # Store processing time for statistics
+            if "processing_time" in result:
+                status = result.get("status", "unknown")
+                processing_times[status].append(result["processing_time"])
+            
+            # Print progress
+            completed = len(task_statuses)
+            print(f"Completed {completed}/{TOTAL_REQUESTS} requests. Latest: Request {request_id} - {result.get('status', 'unknown')}")
         
         queue.task_done()
 
+async def producer(queue: asyncio.Queue) -> None:
+    """Feed request batches into the queue, waiting while it is full."""
+    for i in range(1, TOTAL_REQUESTS + 1, BATCH_SIZE):
+        await queue.put(list(range(i, min(i + BATCH_SIZE, TOTAL_REQUESTS + 1))))
+
 async def main():
     """Main function to run the load test."""
     global start_time, end_time
     
-    print(f"Starting load test with {TOTAL_REQUESTS} requests and {CONCURRENCY} concurrent workers")
+    print(f"Starting load test with {TOTAL_REQUESTS} requests in batches of {BATCH_SIZE} and {CONCURRENCY} concurrent workers")
     print(f"Using image: {IMAGE_PATH}")
     
     # Check if the image file exists
@@ -140,20 +226,41 @@ async def main():
         print(f"Error: Image file {IMAGE_PATH} not found")
         return
     
-    # Create a queue to distribute work
-    queue = asyncio.Queue()
+    # Read the image once and share the bytes across all requests
+    with open(IMAGE_PATH, "rb") as f:
+        image_bytes = f.read()
     
-    # Add all requests to the queue
-    for i in range(1, TOTAL_REQUESTS + 1):
-        queue.put_nowait(i)
+    # Wrap the image once per form field as reusable multipart file parts.
+    # A short last batch of one request still goes to /task, so both are needed.
+    file_payloads = {
+        field_name: build_file_payload(image_bytes, field_name)
+        for field_name in ("file", "files")
+    }
+    
+    # Create a bounded queue to distribute work
+    queue = asyncio.Queue(maxsize=CONCURRENCY * 2)
     
     # Record the start time
     start_time = time.time()
     
-    # Create a session for all HTTP requests
-    async with aiohttp.ClientSession() as session:
+    # Create a single pooled session for all HTTP requests so submit and
+    # poll calls reuse keep-alive connections instead of re-handshaking
+    # Every task in a batch holds its own status stream connection
+    max_connections = CONCURRENCY * (BATCH_SIZE + 1)
+    connector = aiohttp.TCPConnector(
+        limit=max_connections,
+        limit_per_host=max_connections,
+        keepalive_timeout=30,
+        enable_cleanup_closed=True,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=120, connect=5)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         # Create workers
-        workers = [asyncio.create_task(worker(queue, session)) for _ in range(CONCURRENCY)]
+        workers = [asyncio.create_task(worker(queue, session, file_payloads)) for _ in range(CONCURRENCY)]
+        
+        # Feed requests to the workers as they pull them
+        await producer(queue)
         
         # Wait for all tasks to be processed
         await queue.join()
@@ -208,11 +315,12 @@ def print_results():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     result_file = f"load_test_results_{timestamp}.json"
     
-    with open(result_file, "w") as f:
-        json.dump({
+    with open(result_file, "wb") as f:
+        f.write(orjson.dumps({
             "config": {
                 "total_requests": TOTAL_REQUESTS,
                 "concurrency": CONCURRENCY,
+                "batch_size": BATCH_SIZE,
                 "image_path": IMAGE_PATH,
                 "api_url": API_URL
             },
@@ -225,9 +333,15 @@ def print_results():
             "status_counts": {k: v for k, v in status_counts.items()},
             "task_statuses": {str(k): v for k, v in task_statuses.items()},
             "processing_times": {k: v for k, v in processing_times.items()}
-        }, f, indent=2, default=str)
+        }, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str))
     
     print(f"\nDetailed results saved to: {result_file}")
 
 if __name__ == "__main__":
+    # Use uvloop if it is installed
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
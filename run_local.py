@@ -11,30 +11,23 @@ from botocore.exceptions import ClientError
 
 from src.config import settings
 from src.utils.s3 import S3Client
+from src.utils.gpu import get_gpu_count
 
-def get_gpu_count():
-    """Get the number of available GPUs."""
-    try:
-        result = subprocess.run(
-            ["nvidia-smi", "-L"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
-        if result.returncode == 0:
-            return len(result.stdout.strip().split("\n"))
-    except Exception:
-        pass
-    return 0
-
-def start_api(host, port, reload):
+def start_api(host, port, reload, workers=1):
     """Start the FastAPI server."""
-    print(f"Starting API server on {host}:{port}")
+    # Auto-reload only supports a single worker process
+    if reload:
+        workers = 1
+    print(f"Starting API server on {host}:{port} with {workers} worker(s)")
     uvicorn.run(
         "src.api.app:app",
         host=host,
         port=port,
-        reload=reload
+        reload=reload,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        interface="asgi3"
     )
 
 def start_worker(concurrency, loglevel, gpu_index=None):
@@ -55,7 +48,7 @@ def start_worker(concurrency, loglevel, gpu_index=None):
     worker_process = subprocess.Popen(worker_cmd)
     return worker_process
 
-def start_all(host, port, concurrency, loglevel, reload):
+def start_all(host, port, concurrency, loglevel, reload, api_workers=1):
     """Start API and worker(s) based on GPU availability."""
     gpu_count = get_gpu_count()
     worker_processes = []
@@ -69,7 +62,7 @@ def start_all(host, port, concurrency, loglevel, reload):
         worker_processes.append(start_worker(concurrency, loglevel))
     
     try:
-        start_api(host, port, reload)
+        start_api(host, port, reload, api_workers)
     finally:
         print("Stopping workers...")
         for p in worker_processes:
@@ -100,7 +93,7 @@ def check_s3_connection():
             print("⚠️ S3 not configured, skipping check")
             return True
             
-        s3_client = S3Client()
+        s3_client = S3Client.get_instance()
         # Try to list objects to verify connection and permissions
         s3_client.client.list_objects_v2(Bucket=s3_client.bucket_name, MaxKeys=1)
         print(f"✅ S3 connection successful! Bucket '{s3_client.bucket_name}' is accessible.")
@@ -121,6 +114,7 @@ if __name__ == "__main__":
     parser.add_argument("--worker-only", action="store_true", help="Run only the Celery worker")
     parser.add_argument("--host", default="0.0.0.0", help="Host to bind the API server")
     parser.add_argument("--port", type=int, default=8000, help="Port to bind the API server")
+    parser.add_argument("--api-workers", type=int, default=os.cpu_count() or 1, help="Number of API server processes")
     parser.add_argument("--concurrency", type=int, default=1, help="Worker concurrency")
     parser.add_argument("--loglevel", default="info", help="Log level for Celery worker")
     parser.add_argument("--reload", action="store_true", help="Enable auto-reload for development")
@@ -154,7 +148,7 @@ if __name__ == "__main__":
         print("\n=== All checks completed ===\n")
     
     if args.api_only:
-        start_api(args.host, args.port, args.reload)
+        start_api(args.host, args.port, args.reload, args.api_workers)
     elif args.worker_only:
         worker_process = start_worker(args.concurrency, args.loglevel)
         
@@ -172,4 +166,4 @@ if __name__ == "__main__":
         while True:
             time.sleep(1)
     else:
-        start_all(args.host, args.port, args.concurrency, args.loglevel, args.reload)
+        start_all(args.host, args.port, args.concurrency, args.loglevel, args.reload, args.api_workers)
@@ -1,6 +1,8 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
+from redis import asyncio as aioredis
 import time
 import os
 
@@ -8,11 +10,30 @@ from src.api.routes import router
 from src.config.logging import api_logger
 from src.config import settings
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up shared resources on startup and release them on shutdown."""
+    api_logger.info("API starting up")
+    
+    # Create the Redis pool and open a connection before the first request
+    app.state.redis = aioredis.from_url(settings.CELERY_BROKER_URL, max_connections=64)
+    try:
+        await app.state.redis.ping()
+    except Exception as e:
+        api_logger.error(f"Redis connection failed on startup: {e}")
+    
+    yield
+    
+    api_logger.info("API shutting down")
+    await app.state.redis.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="Background Removal API",
     description="API for removing backgrounds from images using AI",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -27,7 +48,7 @@ app.add_middleware(
 # Add request logging middleware
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
+    start_time = time.monotonic()
     
     # Get client IP
     forwarded_for = request.headers.get("X-Forwarded-For")
@@ -43,7 +64,7 @@ async def log_requests(request: Request, call_next):
     response = await call_next(request)
     
     # Calculate processing time
-    process_time = time.time() - start_time
+    process_time = time.monotonic() - start_time
     
     # Log response
     api_logger.info(
@@ -58,7 +79,7 @@ async def log_requests(request: Request, call_next):
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     api_logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"error": "Internal Server Error", "detail": str(exc)}
     )
@@ -69,13 +90,3 @@ app.include_router(router)
 # Create required directories
 os.makedirs(settings.TEMP_UPLOAD_DIR, exist_ok=True)
 os.makedirs(settings.RESULT_DIR, exist_ok=True)
-
-# Startup event
-@app.on_event("startup")
-async def startup_event():
-    api_logger.info("API starting up")
-
-# Shutdown event
-@app.on_event("shutdown")
-async def shutdown_event():
-    api_logger.info("API shutting down")
@@ -1,55 +1,119 @@
-import os
+from pathlib import Path
 import uuid
 import time
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks, Depends
-from fastapi.responses import JSONResponse
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from celery import group
 from celery.result import AsyncResult
-from typing import Optional, Dict, Any
-import json
+from celery.states import READY_STATES
+from pydantic import ValidationError
+from typing import Optional, Dict, Any, List, Tuple
+import orjson
 
 from src.api.schemas import (
     RemoveBackgroundRequest, 
     TaskResponse, 
+    BatchTaskResponse,
     TaskStatusResponse, 
     HealthResponse,
     TaskStatus
 )
 from src.worker.celery_app import app as celery_app
 from src.worker.tasks.remove_bg import remove_background
+from src.utils.events import task_channel
+from src.utils.uploads import store_upload
 from src.config.logging import api_logger
 from src.config import settings
 
 router = APIRouter()
 
+# Short-lived cache of task status lookups and the lookups currently in flight
+STATUS_CACHE_TTL = 0.2  # seconds
+STATUS_CACHE_MAX_SIZE = 10000
+_status_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+_status_inflight: Dict[str, asyncio.Future] = {}
+
+# Content types accepted for uploaded images
+ALLOWED_CONTENT_TYPES = frozenset({"image/jpeg", "image/png", "image/jpg"})
+
+# Map Celery state to our TaskStatus enum
+STATUS_MAPPING = {
+    "PENDING": TaskStatus.PENDING,
+    "STARTED": TaskStatus.PROCESSING,
+    "SUCCESS": TaskStatus.COMPLETED,
+    "FAILURE": TaskStatus.FAILED,
+    "REVOKED": TaskStatus.FAILED
+}
+
+# Task statuses after which no further updates are published
+FINAL_STATUSES = (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value)
+
+# Timing fields copied from task results into status responses
+RESULT_TIME_FIELDS = ("processing_time", "model_time", "queue_time")
+
+# Shared request model used when no request_data is provided
+EMPTY_REQUEST = RemoveBackgroundRequest()
+
 def validate_image_file(file: UploadFile) -> bool:
     """Validate that the uploaded file is an image."""
-    allowed_content_types = ["image/jpeg", "image/png", "image/jpg"]
-    if file.content_type not in allowed_content_types:
-        return False
-    return True
+    return file.content_type in ALLOWED_CONTENT_TYPES
 
 async def save_upload_file(file: UploadFile) -> str:
-    """Save uploaded file to disk and return the path."""
+    """Store uploaded file and return its storage reference."""
     # Create unique filename
     timestamp = int(time.time())
-    unique_id = str(uuid.uuid4())[:8]
+    unique_id = uuid.uuid4().hex[:8]
     original_filename = file.filename
-    extension = os.path.splitext(original_filename)[1]
+    extension = Path(original_filename).suffix
     
     # Create filename with timestamp and unique ID
     filename = f"upload_{timestamp}_{unique_id}{extension}"
-    file_path = os.path.join(settings.TEMP_UPLOAD_DIR, filename)
     
-    # Save file
-    with open(file_path, "wb") as buffer:
-        content = await file.read()
-        buffer.write(content)
+    # Store file off the event loop (local disk, S3 or Redis)
+    file_path = await asyncio.to_thread(store_upload, file.file, filename)
     
     return file_path, original_filename
 
+def parse_request_data(request_data: Optional[str]) -> RemoveBackgroundRequest:
+    """Parse the optional request_data JSON string into a request model."""
+    if not request_data:
+        return EMPTY_REQUEST
+    
+    try:
+        # Parse and validate in one pass in pydantic-core
+        return RemoveBackgroundRequest.model_validate_json(request_data)
+    except ValidationError as e:
+        if any(error["type"] == "json_invalid" for error in e.errors()):
+            api_logger.error(f"Invalid JSON in request_data: {request_data}")
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid JSON in request_data"
+            )
+        api_logger.error(f"Error parsing request data: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error parsing request data: {str(e)}"
+        )
+    except Exception as e:
+        api_logger.error(f"Error parsing request data: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Error parsing request data: {str(e)}"
+        )
+
+def build_callback_data(request: RemoveBackgroundRequest) -> Optional[Dict[str, Any]]:
+    """Build the callback data passed to the worker, if a callback was requested."""
+    if not request.callback_url:
+        return None
+    return {
+        "callback_url": str(request.callback_url),
+        "callback_auth": request.callback_auth,
+        "custom_data": request.custom_data
+    }
+
 @router.post("/task", response_model=TaskResponse, status_code=202)
 async def create_task(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     request_data: Optional[str] = Form(None)
 ):
@@ -68,37 +132,15 @@ async def create_task(
         )
     
     # Parse request data if provided
-    request = RemoveBackgroundRequest()
-    if request_data:
-        try:
-            data = json.loads(request_data)
-            request = RemoveBackgroundRequest(**data)
-        except json.JSONDecodeError:
-            api_logger.error(f"Invalid JSON in request_data: {request_data}")
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid JSON in request_data"
-            )
-        except Exception as e:
-            api_logger.error(f"Error parsing request data: {e}")
-            raise HTTPException(
-                status_code=400,
-                detail=f"Error parsing request data: {str(e)}"
-            )
+    request = parse_request_data(request_data)
     
     try:
         # Save uploaded file
         file_path, original_filename = await save_upload_file(file)
-        api_logger.info(f"File saved to {file_path}")
+        api_logger.debug(f"File stored at {file_path}")
         
         # Prepare callback data
-        callback_data = None
-        if request.callback_url:
-            callback_data = {
-                "callback_url": str(request.callback_url),
-                "callback_auth": request.callback_auth,
-                "custom_data": request.custom_data
-            }
+        callback_data = build_callback_data(request)
         
         creation_time = time.time()
         # Submit task to Celery
@@ -112,9 +154,10 @@ async def create_task(
         
         api_logger.info(f"Task created with ID: {task.id}")
         
-        return TaskResponse(
-            task_id=task.id,
-            status=TaskStatus.PENDING
+        # Return the body directly, skipping response model serialization
+        return ORJSONResponse(
+            {"task_id": task.id, "status": TaskStatus.PENDING.value},
+            status_code=202
         )
     
     except Exception as e:
@@ -124,7 +167,124 @@ async def create_task(
             detail=f"Error creating task: {str(e)}"
         )
 
-@router.get("/task/{task_id}", response_model=TaskStatusResponse)
+@router.post("/tasks", response_model=BatchTaskResponse, status_code=202)
+async def create_tasks(
+    files: List[UploadFile] = File(...),
+    request_data: Optional[str] = Form(None)
+):
+    """
+    Create background removal tasks for several images in one request.
+    
+    - **files**: Image files to remove background from (JPEG or PNG)
+    - **request_data**: Optional JSON string with additional parameters, applied to every task
+    """
+    # Validate files
+    for file in files:
+        if not validate_image_file(file):
+            api_logger.error(f"Invalid file type: {file.content_type}")
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid file type in {file.filename}. Supported types: JPEG, PNG."
+            )
+    
+    # Parse request data if provided
+    request = parse_request_data(request_data)
+    
+    try:
+        # Save uploaded files concurrently
+        saved_files = await asyncio.gather(*(save_upload_file(file) for file in files))
+        api_logger.info(f"Stored {len(saved_files)} files for batch")
+        
+        # Prepare callback data
+        callback_data = build_callback_data(request)
+        
+        creation_time = time.time()
+        # Submit all tasks to Celery in one group
+        group_result = group(
+            remove_background.s(file_path, original_filename, callback_data, creation_time=creation_time)
+            for file_path, original_filename in saved_files
+        ).apply_async(queue='gpu')
+        
+        task_ids = [result.id for result in group_result.results]
+        api_logger.info(f"Batch created with {len(task_ids)} tasks")
+        
+        return ORJSONResponse({"task_ids": task_ids}, status_code=202)
+    
+    except Exception as e:
+        api_logger.error(f"Error creating batch tasks: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating batch tasks: {str(e)}"
+        )
+
+def build_status_body(task_id: str, state: str, result: Any) -> Dict[str, Any]:
+    """
+    Build a task status response body from a Celery state and result.
+    Optional fields are only included when they have a value.
+    """
+    status = STATUS_MAPPING.get(state, TaskStatus.PENDING)
+    
+    # Prepare response
+    body = {
+        "task_id": task_id,
+        "status": status.value
+    }
+    
+    # Add result URL if task is completed
+    if status == TaskStatus.COMPLETED and isinstance(result, dict):
+        if result.get("result_url") is not None:
+            body["result_url"] = result["result_url"]
+    
+    # Add error if task failed
+    if status == TaskStatus.FAILED:
+        if not result:
+            body["error"] = "Unknown error"
+        elif isinstance(result, Exception):
+            body["error"] = str(result)
+        elif isinstance(result, dict) and result.get("error") is not None:
+            body["error"] = result["error"]
+    
+    # Add time information for finished tasks
+    if status in (TaskStatus.COMPLETED, TaskStatus.FAILED) and isinstance(result, dict):
+        for key in RESULT_TIME_FIELDS:
+            value = result.get(key)
+            if value is not None:
+                body[key] = value
+    
+    return body
+
+def lookup_task_status(task_id: str) -> Dict[str, Any]:
+    """Read the status of a task from the Celery result backend."""
+    # Get task result
+    task_result = AsyncResult(task_id, app=celery_app)
+    
+    # Check if task exists
+    if not task_result.state:
+        api_logger.error(f"Task not found: {task_id}")
+        raise HTTPException(
+            status_code=404,
+            detail=f"Task not found: {task_id}"
+        )
+    
+    return build_status_body(task_id, task_result.state, task_result.result)
+
+async def fetch_task_status(task_id: str) -> Dict[str, Any]:
+    """Look up the status of a task off the event loop and cache the result."""
+    try:
+        body = await asyncio.to_thread(lookup_task_status, task_id)
+        
+        # Drop expired entries before the cache grows too large
+        now = time.monotonic()
+        if len(_status_cache) >= STATUS_CACHE_MAX_SIZE:
+            for key in [key for key, (cached_at, _) in _status_cache.items() if now - cached_at >= STATUS_CACHE_TTL]:
+                del _status_cache[key]
+        _status_cache[task_id] = (now, body)
+        
+        return body
+    finally:
+        _status_inflight.pop(task_id, None)
+
+@router.get("/task/{task_id}", responses={200: {"model": TaskStatusResponse}})
 async def get_task_status(task_id: str):
     """
     Get the status of a background removal task.
@@ -132,67 +292,18 @@ async def get_task_status(task_id: str):
     - **task_id**: ID of the task to check
     """
     try:
-        # Get task result
-        task_result = AsyncResult(task_id, app=celery_app)
+        # Serve recent lookups from the cache
+        cached = _status_cache.get(task_id)
+        if cached and time.monotonic() - cached[0] < STATUS_CACHE_TTL:
+            return ORJSONResponse(cached[1])
         
-        # Check if task exists
-        if not task_result.state:
-            api_logger.error(f"Task not found: {task_id}")
-            raise HTTPException(
-                status_code=404,
-                detail=f"Task not found: {task_id}"
-            )
+        # Share a single backend lookup between concurrent requests for the same task
+        lookup = _status_inflight.get(task_id)
+        if lookup is None:
+            lookup = asyncio.ensure_future(fetch_task_status(task_id))
+            _status_inflight[task_id] = lookup
         
-        # Map Celery state to our TaskStatus enum
-        status_mapping = {
-            "PENDING": TaskStatus.PENDING,
-            "STARTED": TaskStatus.PROCESSING,
-            "SUCCESS": TaskStatus.COMPLETED,
-            "FAILURE": TaskStatus.FAILED,
-            "REVOKED": TaskStatus.FAILED
-        }
-        
-        status = status_mapping.get(task_result.state, TaskStatus.PENDING)
-        
-        # Prepare response
-        response = TaskStatusResponse(
-            task_id=task_id,
-            status=status
-        )
-        
-        # Add result URL if task is completed
-        if status == TaskStatus.COMPLETED and task_result.result:
-            result = task_result.result
-            if isinstance(result, dict):
-                if "result_url" in result:
-                    response.result_url = result["result_url"]
-                # Add time information
-                if "processing_time" in result:
-                    response.processing_time = result["processing_time"]
-                if "model_time" in result:
-                    response.model_time = result["model_time"]
-                if "queue_time" in result:
-                    response.queue_time = result["queue_time"]
-        
-        # Add error if task failed
-        if status == TaskStatus.FAILED:
-            if task_result.result:
-                if isinstance(task_result.result, Exception):
-                    response.error = str(task_result.result)
-                elif isinstance(task_result.result, dict):
-                    if "error" in task_result.result:
-                        response.error = task_result.result["error"]
-                    # Add time information for failed tasks
-                    if "processing_time" in task_result.result:
-                        response.processing_time = task_result.result["processing_time"]
-                    if "model_time" in task_result.result:
-                        response.model_time = task_result.result["model_time"]
-                    if "queue_time" in task_result.result:
-                        response.queue_time = task_result.result["queue_time"]
-            else:
-                response.error = "Unknown error"
-        
-        return response
+        return ORJSONResponse(await asyncio.shield(lookup))
     
     except HTTPException:
         raise
@@ -203,6 +314,114 @@ async def get_task_status(task_id: str):
             detail=f"Error getting task status: {str(e)}"
         )
 
+@router.get("/task/{task_id}/wait", responses={200: {"model": TaskStatusResponse}})
+async def wait_task_status(task_id: str, request: Request):
+    """
+    Wait for a background removal task to finish (long-poll).
+    
+    Blocks until the task completes or fails, or until the wait timeout
+    expires, and then returns the current task status.
+    
+    - **task_id**: ID of the task to wait for
+    """
+    try:
+        pubsub = request.app.state.redis.pubsub()
+        try:
+            # Subscribe before reading the state so no event is missed
+            await pubsub.subscribe(task_channel(task_id))
+            
+            body = await asyncio.to_thread(lookup_task_status, task_id)
+            if body["status"] in FINAL_STATUSES:
+                return ORJSONResponse(body)
+            
+            # Wait for the worker to publish a completion event
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.TASK_WAIT_TIMEOUT
+            while (remaining := deadline - loop.time()) > 0:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+                if message and message["type"] == "message":
+                    event = orjson.loads(message["data"])
+                    if event["state"] in READY_STATES:
+                        return ORJSONResponse(build_status_body(task_id, event["state"], event.get("result")))
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+        
+        # Timed out, fall back to a one-shot status read
+        body = await asyncio.to_thread(lookup_task_status, task_id)
+        return ORJSONResponse(body)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        api_logger.error(f"Error waiting for task status: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error waiting for task status: {str(e)}"
+        )
+
+def format_sse_event(body: Dict[str, Any]) -> str:
+    """Format a task status body as a server-sent event frame."""
+    return f"data: {orjson.dumps(body).decode()}\n\n"
+
+@router.get("/task/{task_id}/stream")
+async def stream_task_status(task_id: str, request: Request):
+    """
+    Stream status updates for a background removal task as server-sent events.
+    
+    Sends the current status immediately, then one event per status change
+    until the task completes or fails.
+    
+    - **task_id**: ID of the task to follow
+    """
+    pubsub = request.app.state.redis.pubsub()
+    try:
+        # Subscribe before reading the state so no event is missed
+        await pubsub.subscribe(task_channel(task_id))
+        current = await asyncio.to_thread(lookup_task_status, task_id)
+    except HTTPException:
+        await pubsub.close()
+        raise
+    except Exception as e:
+        await pubsub.close()
+        api_logger.error(f"Error streaming task status: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error streaming task status: {str(e)}"
+        )
+    
+    async def event_stream():
+        status = current["status"]
+        try:
+            yield format_sse_event(current)
+            while status not in FINAL_STATUSES:
+                message = await pubsub.get_message(timeout=settings.TASK_WAIT_TIMEOUT)
+                if message is None:
+                    # No event for a while, re-check the backend in case one was missed
+                    body = await asyncio.to_thread(lookup_task_status, task_id)
+                    if body["status"] == status:
+                        yield ": keepalive\n\n"
+                        continue
+                elif message["type"] == "message":
+                    event = orjson.loads(message["data"])
+                    body = build_status_body(task_id, event["state"], event.get("result"))
+                    if body["status"] == status:
+                        continue
+                else:
+                    continue
+                
+                status = body["status"]
+                yield format_sse_event(body)
+        finally:
+            await pubsub.unsubscribe()
+            await pubsub.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     """
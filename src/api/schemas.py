@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator, AnyUrl
+from pydantic import BaseModel, ConfigDict, Field, field_validator, AnyUrl
 from typing import Optional, Dict, Any, List
 from enum import Enum
 
@@ -24,27 +24,44 @@ class RemoveBackgroundRequest(BaseModel):
         description="Custom data to include in callback"
     )
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "callback_url": "https://example.com/callback",
                 "callback_auth": "Bearer token123",
                 "custom_data": {"user_id": "123", "order_id": "456"}
             }
         }
+    )
 
 class TaskResponse(BaseModel):
     """Response model for task creation."""
     task_id: str = Field(..., description="ID of the created task")
     status: TaskStatus = Field(..., description="Current status of the task")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "task_id": "12345678-1234-5678-1234-567812345678",
                 "status": "pending"
             }
         }
+    )
+
+class BatchTaskResponse(BaseModel):
+    """Response model for batch task creation."""
+    task_ids: List[str] = Field(..., description="IDs of the created tasks, in upload order")
+    
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "task_ids": [
+                    "12345678-1234-5678-1234-567812345678",
+                    "87654321-4321-8765-4321-876543218765"
+                ]
+            }
+        }
+    )
 
 class TaskStatusResponse(BaseModel):
     """Response model for task status."""
@@ -71,7 +88,8 @@ class TaskStatusResponse(BaseModel):
         description="Time spent waiting in queue before processing"
     )
     
-    @validator('result_url')
+    @field_validator('result_url')
+    @classmethod
     def validate_url(cls, v):
         if v is None:
             return v
@@ -80,8 +98,8 @@ class TaskStatusResponse(BaseModel):
             return v
         raise ValueError('URL must start with http:// or https://')
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "task_id": "12345678-1234-5678-1234-567812345678",
                 "status": "completed",
@@ -91,6 +109,7 @@ class TaskStatusResponse(BaseModel):
                 "queue_time": 0.123
             }
         }
+    )
 
 class HealthResponse(BaseModel):
     """Response model for health check."""
@@ -98,8 +117,8 @@ class HealthResponse(BaseModel):
     version: str = Field(..., description="Service version")
     components: Dict[str, str] = Field(..., description="Status of service components")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "status": "healthy",
                 "version": "1.0.0",
@@ -110,16 +129,18 @@ class HealthResponse(BaseModel):
                 }
             }
         }
+    )
 
 class ErrorResponse(BaseModel):
     """Response model for errors."""
     error: str = Field(..., description="Error message")
     detail: Optional[str] = Field(None, description="Detailed error information")
     
-    class Config:
-        schema_extra = {
+    model_config = ConfigDict(
+        json_schema_extra={
             "example": {
                 "error": "Bad Request",
                 "detail": "Invalid file format. Only JPEG and PNG are supported."
             }
         }
+    )
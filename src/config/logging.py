@@ -1,6 +1,8 @@
 import os
+import atexit
+import queue
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 LOG_DIR = os.getenv('LOG_DIR', 'logs')
@@ -10,6 +12,42 @@ LOG_FILE_BACKUP_COUNT = 5
 # Create logs directory if it doesn't exist
 os.makedirs(LOG_DIR, exist_ok=True)
 
+class LoggerRouter(logging.Handler):
+    """Dispatch queued records to the console and file handlers of the logger that emitted them."""
+    
+    def __init__(self):
+        super().__init__()
+        self.handlers_by_logger = {}
+    
+    def add(self, name, handler):
+        """Register a handler for records from the named logger."""
+        self.handlers_by_logger.setdefault(name, []).append(handler)
+    
+    def handle(self, record):
+        for handler in self.handlers_by_logger.get(record.name, []):
+            if record.levelno >= handler.level:
+                handler.handle(record)
+        return True
+
+# Loggers only enqueue records; a background listener does the console and file I/O
+_log_router = LoggerRouter()
+_queue_handlers = []
+_log_listener = None
+
+def _start_listener():
+    """Start the listener thread that writes queued records, with a fresh queue."""
+    global _log_listener
+    log_queue = queue.Queue(-1)
+    for queue_handler in _queue_handlers:
+        queue_handler.queue = log_queue
+    _log_listener = QueueListener(log_queue, _log_router)
+    _log_listener.start()
+
+def stop_log_listener():
+    """Flush queued records and stop the listener thread."""
+    if _log_listener is not None:
+        _log_listener.stop()
+
 def setup_logger(name, log_file=None):
     """Set up logger with console and file handlers."""
     logger = logging.getLogger(name)
@@ -26,7 +64,7 @@ def setup_logger(name, log_file=None):
     # Create console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    _log_router.add(name, console_handler)
     
     # Create file handler if log_file is provided
     if log_file:
@@ -36,10 +74,20 @@ def setup_logger(name, log_file=None):
             backupCount=LOG_FILE_BACKUP_COUNT
         )
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        _log_router.add(name, file_handler)
+    
+    queue_handler = QueueHandler(_log_listener.queue)
+    _queue_handlers.append(queue_handler)
+    logger.addHandler(queue_handler)
     
     return logger
 
+_start_listener()
+atexit.register(stop_log_listener)
+
+# Forked worker processes do not inherit the listener thread, so start a new one
+os.register_at_fork(after_in_child=_start_listener)
+
 # Create loggers
 api_logger = setup_logger('api', 'api.log')
 worker_logger = setup_logger('worker', 'worker.log')
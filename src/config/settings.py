@@ -23,6 +23,8 @@ CELERY_ENABLE_UTC = True
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutes
 CELERY_WORKER_CONCURRENCY = int(os.getenv('CELERY_WORKER_CONCURRENCY', '1'))
+CELERY_WORKER_POOL = os.getenv('CELERY_WORKER_POOL', 'prefork')  # 'threads' lets tasks share one batched model
+TASK_WAIT_TIMEOUT = int(os.getenv('TASK_WAIT_TIMEOUT', '30'))  # Long-poll timeout in seconds
 
 # S3 Settings
 S3_ENDPOINT = os.getenv('S3_ENDPOINT', '')
@@ -36,16 +38,29 @@ S3_USE_SSL = os.getenv('S3_USE_SSL', 'True').lower() == 'true'
 CALLBACK_ENABLED = os.getenv('CALLBACK_ENABLED', 'True').lower() == 'true'
 CALLBACK_URL = os.getenv('CALLBACK_URL', '')
 CALLBACK_AUTH_TOKEN = os.getenv('CALLBACK_AUTH_TOKEN', '')
+CALLBACK_BATCH_URL = os.getenv('CALLBACK_BATCH_URL', '')  # Enables batched callbacks when set
+CALLBACK_BATCH_MAX_SIZE = int(os.getenv('CALLBACK_BATCH_MAX_SIZE', '32'))
+CALLBACK_BATCH_FLUSH_MS = int(os.getenv('CALLBACK_BATCH_FLUSH_MS', '50'))
 
 # Model Settings
 MODEL_PATH = os.getenv('MODEL_PATH', 'models/u2net.onnx')
 DEVICE = os.getenv('DEVICE', 'cuda')  # 'cuda' or 'cpu'
-BATCH_SIZE = int(os.getenv('BATCH_SIZE', '1'))
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '1'))  # Maximum images per inference call
+BATCH_FLUSH_MS = int(os.getenv('BATCH_FLUSH_MS', '10'))  # Wait for more images before running a partial batch
 IMG_SIZE = int(os.getenv('IMG_SIZE', '320'))
+MODEL_PRECISION = os.getenv('MODEL_PRECISION', 'auto').lower()  # 'auto', 'fp32', 'fp16' or 'int8'
+TENSORRT_ENABLED = os.getenv('TENSORRT_ENABLED', 'False').lower() == 'true'
+TENSORRT_CACHE_DIR = os.getenv('TENSORRT_CACHE_DIR', 'models/trt-cache')
+MASK_RESIZE_LINEAR = os.getenv('MASK_RESIZE_LINEAR', 'False').lower() == 'true'  # Bilinear mask resize before thresholding
+CUDA_GRAPH_ENABLED = os.getenv('CUDA_GRAPH_ENABLED', 'False').lower() == 'true'  # Capture the CUDA inference path as a graph
 
 # Storage Settings
 TEMP_UPLOAD_DIR = os.getenv('TEMP_UPLOAD_DIR', '/tmp/rmbg-uploads')
 RESULT_DIR = os.getenv('RESULT_DIR', '/tmp/rmbg-results')
+RESULT_FORMAT = os.getenv('RESULT_FORMAT', 'png').lower()  # 'png' or 'webp' (lossless)
+PNG_COMPRESSION = int(os.getenv('PNG_COMPRESSION', '1'))  # 0-9, higher is smaller but slower to encode
+UPLOAD_STORAGE = os.getenv('UPLOAD_STORAGE', 'local').lower()  # 'local', 's3' or 'redis'
+UPLOAD_REDIS_TTL = int(os.getenv('UPLOAD_REDIS_TTL', '300'))  # 5 minutes
 
 # Create directories if they don't exist
 os.makedirs(TEMP_UPLOAD_DIR, exist_ok=True)
@@ -1,39 +1,104 @@
 import json
+import queue
+import threading
+import time
 import requests
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
+from urllib3.util import Retry
 from src.config.logging import callback_logger
 from src.config import settings
 
+# Global variable to store the shared callback client instance
+_client_instance = None
+
+# Background threads used to send callbacks off the task's critical path
+_callback_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="callback")
+
+# Status codes meaning the batch endpoint is not supported by the server
+BATCH_UNSUPPORTED_STATUS_CODES = (404, 405, 501)
+
+# Queued to tell the batch sender thread to send what it has and exit
+BATCH_SENDER_STOP = object()
+
 class CallbackClient:
     """Client for sending callbacks to external services."""
     
+    @classmethod
+    def get_instance(cls):
+        """
+        Get or create the shared callback client for the current process.
+        
+        Returns:
+            CallbackClient: Shared client instance, whose connection pool persists across tasks
+        """
+        global _client_instance
+        if _client_instance is None:
+            _client_instance = cls()
+        return _client_instance
+    
     def __init__(self):
         """Initialize callback client with configuration from settings."""
         self.enabled = settings.CALLBACK_ENABLED
         self.callback_url = settings.CALLBACK_URL
         self.auth_token = settings.CALLBACK_AUTH_TOKEN
+        
+        # Batching of callbacks sent to the configured URL
+        self.batch_url = settings.CALLBACK_BATCH_URL
+        self.batch_max_size = settings.CALLBACK_BATCH_MAX_SIZE
+        self.batch_flush_interval = settings.CALLBACK_BATCH_FLUSH_MS / 1000
+        self._batch_queue = queue.Queue()
+        self._batch_sender = None
+        self._batch_sender_lock = threading.Lock()
+        
+        # Last pending callback per task, so a task's callbacks are delivered in order
+        self._pending_by_task = {}
+        self._pending_lock = threading.Lock()
+        
+        # Headers used when no per-request authorization is given
+        self.default_headers = {
+            "Content-Type": "application/json"
+        }
+        if self.auth_token:
+            self.default_headers["Authorization"] = f"Bearer {self.auth_token}"
+        
+        # Keep-alive session so callbacks reuse TCP/TLS connections
+        retry = Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
     
-    def send_callback(self, task_id, status, result_url=None, error=None):
+    def _build_callback(self, task_id, status, result_url=None, error=None, callback_url=None,
+                        callback_auth=None, custom_data=None, **timings):
         """
-        Send a callback notification to the configured URL.
+        Build the target URL, headers and payload for a callback.
         
-        Args:
-            task_id (str): ID of the task
-            status (str): Status of the task (pending, processing, completed, failed)
-            result_url (str, optional): URL of the result file
-            error (str, optional): Error message if task failed
-            
         Returns:
-            bool: True if callback was sent successfully, False otherwise
+            tuple: (url, headers, callback_data), or None if callbacks are disabled
         """
-        if not self.enabled or not self.callback_url:
-            callback_logger.info(f"Callbacks disabled or URL not configured. Task {task_id} status: {status}")
-            return False
+        if not self.enabled:
+            callback_logger.debug("Callbacks disabled, task %s status: %s", task_id, status)
+            return None
+        
+        callback_url = callback_url or self.callback_url
+        if not callback_url:
+            callback_logger.debug("Callback URL not configured, task %s status: %s", task_id, status)
+            return None
         
         # Prepare callback data
         callback_data = {
             "task_id": task_id,
             "status": status,
+            # Lets the receiver drop duplicates when a callback is retried
+            "idempotency_key": f"{task_id}:{status}",
         }
         
         if result_url:
@@ -42,33 +107,240 @@ class CallbackClient:
         if error:
             callback_data["error"] = error
         
+        if custom_data:
+            callback_data["custom_data"] = custom_data
+        
+        for key, value in timings.items():
+            if value is not None:
+                callback_data[key] = value
+        
         # Prepare headers
-        headers = {
-            "Content-Type": "application/json"
-        }
+        if callback_auth:
+            headers = {**self.default_headers, "Authorization": callback_auth}
+        else:
+            headers = self.default_headers
         
-        if self.auth_token:
-            headers["Authorization"] = f"Bearer {self.auth_token}"
+        return callback_url, headers, callback_data
+    
+    def _post(self, url, headers, payload, description):
+        """
+        POST a JSON payload and log the outcome.
         
-        # Send callback
+        Returns:
+            requests.Response: Response from the server, or None if the request failed
+        """
         try:
-            callback_logger.info(f"Sending callback for task {task_id}, status: {status}")
-            response = requests.post(
-                self.callback_url,
-                json=callback_data,
+            response = self.session.post(
+                url,
+                json=payload,
                 headers=headers,
-                timeout=10
+                timeout=(3, 10)
             )
             
             if response.ok:
-                callback_logger.info(f"Callback sent successfully for task {task_id}")
-                return True
+                callback_logger.debug(f"Callback sent successfully for {description}")
             else:
                 callback_logger.error(
-                    f"Failed to send callback for task {task_id}. "
+                    f"Failed to send callback for {description}. "
                     f"Status code: {response.status_code}, Response: {response.text}"
                 )
-                return False
+            return response
         except RequestException as e:
-            callback_logger.error(f"Exception sending callback for task {task_id}: {e}")
+            callback_logger.error(f"Exception sending callback for {description}: {e}")
+            return None
+    
+    def _send_single(self, url, headers, callback_data):
+        """Send one callback and return True if it was delivered."""
+        headers = {**headers, "Idempotency-Key": callback_data["idempotency_key"]}
+        response = self._post(url, headers, callback_data, f"task {callback_data['task_id']}")
+        return response is not None and response.ok
+    
+    def send_callback(self, task_id, status, result_url=None, error=None, callback_url=None,
+                      callback_auth=None, custom_data=None, **timings):
+        """
+        Send a callback notification to the configured URL.
+        
+        Args:
+            task_id (str): ID of the task
+            status (str): Status of the task (pending, processing, completed, failed)
+            result_url (str, optional): URL of the result file
+            error (str, optional): Error message if task failed
+            callback_url (str, optional): URL to notify instead of the configured one
+            callback_auth (str, optional): Authorization header value instead of the configured token
+            custom_data (dict, optional): Custom data to include in the callback
+            **timings: Timing information to include (processing_time, model_time, queue_time)
+        
+        Returns:
+            bool: True if callback was sent successfully, False otherwise
+        """
+        callback = self._build_callback(
+            task_id, status, result_url, error, callback_url, callback_auth, custom_data, **timings
+        )
+        if callback is None:
             return False
+        
+        callback_logger.debug(f"Sending callback for task {task_id}, status: {status}")
+        return self._send_single(*callback)
+    
+    def send_callback_async(self, task_id, status, **kwargs):
+        """
+        Send a callback notification in a background thread.
+        
+        Takes the same arguments as send_callback. When CALLBACK_BATCH_URL is
+        set, callbacks for the configured URL are buffered briefly and sent
+        together in a single request.
+        
+        Returns:
+            concurrent.futures.Future: Future resolving to True if the callback was delivered
+        """
+        callback = self._build_callback(task_id, status, **kwargs)
+        if callback is None:
+            future = Future()
+            future.set_result(False)
+            return future
+        
+        url, headers, callback_data = callback
+        if not self._is_batchable(url, headers):
+            return self._submit_in_order(task_id, self._send_single, url, headers, callback_data)
+        
+        future = Future()
+        self._ensure_batch_sender()
+        self._batch_queue.put((callback_data, future))
+        return future
+    
+    def _submit_in_order(self, task_id, fn, *args):
+        """
+        Submit a send to the executor after the previous callback of the same task.
+        
+        Returns:
+            concurrent.futures.Future: Future of the send
+        """
+        with self._pending_lock:
+            previous = self._pending_by_task.get(task_id)
+            future = _callback_executor.submit(_run_after, previous, fn, *args)
+            self._pending_by_task[task_id] = future
+        
+        def forget(done):
+            with self._pending_lock:
+                if self._pending_by_task.get(task_id) is done:
+                    del self._pending_by_task[task_id]
+        
+        future.add_done_callback(forget)
+        future.add_done_callback(_log_callback_exception)
+        return future
+    
+    def _is_batchable(self, url, headers):
+        """Check whether a callback can be merged into a batch request."""
+        return bool(self.batch_url) and url == self.callback_url and headers is self.default_headers
+    
+    def _ensure_batch_sender(self):
+        """Start the batch sender thread for this process if it is not running."""
+        with self._batch_sender_lock:
+            if self._batch_sender is None or not self._batch_sender.is_alive():
+                self._batch_sender = threading.Thread(
+                    target=self._run_batch_sender,
+                    name="callback-batcher",
+                    daemon=True
+                )
+                self._batch_sender.start()
+    
+    def _run_batch_sender(self):
+        """Collect queued callbacks into batches and hand them to the executor."""
+        previous = None
+        stopping = False
+        while not stopping:
+            item = self._batch_queue.get()
+            if item is BATCH_SENDER_STOP:
+                break
+            batch = [item]
+            
+            # Wait up to the flush interval for more callbacks to arrive
+            deadline = time.monotonic() + self.batch_flush_interval
+            while len(batch) < self.batch_max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._batch_queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is BATCH_SENDER_STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            # Send batches one after another so callbacks keep their queue order
+            previous = _callback_executor.submit(_run_after, previous, self._send_batch, batch)
+            previous.add_done_callback(_log_callback_exception)
+    
+    def close(self):
+        """
+        Send all pending callbacks and wait for them to finish.
+        
+        Flushes the batch queue, then waits for every callback already handed
+        to the executor. Call this before the process exits, since pool
+        processes end with os._exit() and would drop them otherwise.
+        """
+        with self._batch_sender_lock:
+            sender = self._batch_sender
+            if sender is not None and sender.is_alive():
+                self._batch_queue.put(BATCH_SENDER_STOP)
+                sender.join()
+            self._batch_sender = None
+        
+        _callback_executor.shutdown(wait=True)
+    
+    def _send_batch(self, batch):
+        """Send a batch of callbacks, falling back to one request per callback."""
+        try:
+            self._deliver_batch(batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            raise
+    
+    def _deliver_batch(self, batch):
+        """Deliver a batch of callbacks and resolve their futures."""
+        results = None
+        if len(batch) > 1 and self.batch_url:
+            events = [callback_data for callback_data, _ in batch]
+            callback_logger.info(f"Sending batch of {len(events)} callbacks")
+            response = self._post(self.batch_url, self.default_headers, {"events": events}, f"batch of {len(events)} callbacks")
+            
+            if response is not None and response.status_code in BATCH_UNSUPPORTED_STATUS_CODES:
+                callback_logger.error("Batch callback endpoint not supported, sending callbacks individually")
+                self.batch_url = ""
+            else:
+                delivered = response is not None and response.ok
+                results = [delivered] * len(batch)
+        
+        if results is None:
+            results = [
+                self._send_single(self.callback_url, self.default_headers, callback_data)
+                for callback_data, _ in batch
+            ]
+        
+        for (_, future), delivered in zip(batch, results):
+            future.set_result(delivered)
+
+def _run_after(previous, fn, *args):
+    """
+    Wait for a previously submitted send to finish, then call fn.
+    The previous send was submitted earlier, so it is already running or
+    ahead in the executor queue and this wait cannot deadlock.
+    """
+    if previous is not None:
+        wait([previous])
+    return fn(*args)
+
+def _log_callback_exception(future):
+    """Log unexpected errors raised while sending a callback in the background."""
+    exc = future.exception()
+    if exc is not None:
+        callback_logger.error(f"Unexpected error sending callback: {exc}")
+
+def close_client():
+    """Flush the shared callback client of the current process, if it was created."""
+    if _client_instance is not None:
+        _client_instance.close()
@@ -0,0 +1,38 @@
+import orjson
+import redis
+from src.config.logging import worker_logger
+from src.config import settings
+
+# Redis client used to publish task events (created lazily per process)
+_redis_client = None
+
+def task_channel(task_id):
+    """Return the Redis pub/sub channel name for a task."""
+    return f"task:{task_id}"
+
+def get_redis_client():
+    """Get or create the Redis client used for publishing task events."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+    return _redis_client
+
+def publish_task_event(task_id, state, result=None):
+    """
+    Publish a task state change so waiting clients can wake up.
+    
+    Args:
+        task_id (str): ID of the task
+        state (str): Celery state of the task (e.g. SUCCESS, FAILURE)
+        result (dict, optional): Task result or error information
+        
+    Returns:
+        bool: True if the event was published, False otherwise
+    """
+    try:
+        message = orjson.dumps({"state": state, "result": result}, default=str)
+        get_redis_client().publish(task_channel(task_id), message)
+        return True
+    except redis.RedisError as e:
+        worker_logger.error(f"Failed to publish event for task {task_id}: {e}")
+        return False
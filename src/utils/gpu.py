@@ -0,0 +1,65 @@
+import os
+import subprocess
+
+# Global variable to store the GPU count, detected once per process
+_gpu_count = None
+
+def get_gpu_count():
+    """
+    Get the number of GPUs visible to this process.
+    
+    Honors CUDA_VISIBLE_DEVICES when it is set, otherwise counts the
+    devices listed by nvidia-smi.
+    
+    Returns:
+        int: Number of visible GPUs, 0 if none are available
+    """
+    global _gpu_count
+    if _gpu_count is None:
+        _gpu_count = _detect_gpu_count()
+    return _gpu_count
+
+def pin_gpu(index):
+    """
+    Restrict this process to a single GPU chosen round-robin by index.
+    Must run before the first CUDA context is created in the process.
+    
+    Args:
+        index (int): Stable index of the worker process
+        
+    Returns:
+        str: Device ID now exposed as CUDA device 0, or None if no GPU is available
+    """
+    global _gpu_count
+    devices = _visible_devices()
+    if not devices:
+        return None
+    
+    device = devices[index % len(devices)]
+    os.environ['CUDA_VISIBLE_DEVICES'] = device
+    _gpu_count = 1
+    return device
+
+def _detect_gpu_count():
+    """Detect the number of visible GPUs."""
+    return len(_visible_devices())
+
+def _visible_devices():
+    """List the device IDs visible to this process."""
+    visible_devices = os.environ.get('CUDA_VISIBLE_DEVICES')
+    if visible_devices is not None:
+        return [device.strip() for device in visible_devices.split(',') if device.strip() and device.strip() != '-1']
+    
+    try:
+        result = subprocess.run(
+            ["nvidia-smi", "-L"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True
+        )
+        if result.returncode == 0:
+            count = len([line for line in result.stdout.strip().split("\n") if line.startswith("GPU")])
+            return [str(device) for device in range(count)]
+    except Exception:
+        pass
+    return []
@@ -0,0 +1,44 @@
+import os
+import asyncio
+import threading
+
+# Global variables to store the event loop shared by I/O clients in this process
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+def get_loop():
+    """
+    Get or start the I/O event loop for the current process.
+    
+    The loop runs forever in a daemon thread. A forked worker process does
+    not inherit the thread, so it gets its own loop on first use.
+    
+    Returns:
+        asyncio.AbstractEventLoop: Running event loop
+    """
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            thread = threading.Thread(
+                target=_loop.run_forever,
+                name="io-loop",
+                daemon=True
+            )
+            thread.start()
+    return _loop
+
+def run(coro, timeout=None):
+    """
+    Run a coroutine on the I/O event loop and wait for its result.
+    
+    Args:
+        coro (coroutine): Coroutine to run
+        timeout (float, optional): Maximum time to wait in seconds
+    
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
@@ -1,13 +1,51 @@
 import os
 import boto3
+from boto3.s3.transfer import S3Transfer, TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
 from urllib.parse import urlparse
+from src.utils import io_loop
 from src.config.logging import s3_logger
 from src.config import settings
 
+# Global variable to store the shared client instances (one per configuration)
+_client_instances = {}
+
+# Files below this size are sent with a single put_object call
+PUT_OBJECT_MAX_SIZE = 5 * 1024 * 1024  # 5MB
+
+# Larger files are uploaded in parallel parts
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True
+)
+
 class S3Client:
     """Client for interacting with S3 storage."""
     
+    @classmethod
+    def get_instance(cls):
+        """
+        Get or create the shared S3 client for the current configuration.
+        
+        The bucket check only runs when the instance is first created, so
+        callers on the per-task path never pay for it.
+        
+        Returns:
+            S3Client: Shared client instance for this process
+        """
+        global _client_instances
+        key = (settings.S3_ENDPOINT, settings.S3_ACCESS_KEY, settings.S3_REGION, settings.S3_BUCKET_NAME)
+        if key not in _client_instances:
+            s3_logger.info(f"Creating new S3 client for bucket {settings.S3_BUCKET_NAME}")
+            instance = cls()
+            instance._ensure_bucket_exists()
+            _client_instances[key] = instance
+        return _client_instances[key]
+    
     def __init__(self):
         """Initialize S3 client with configuration from settings."""
         self.endpoint = settings.S3_ENDPOINT
@@ -17,32 +55,47 @@ class S3Client:
         self.region = settings.S3_REGION
         self.use_ssl = settings.S3_USE_SSL
         
+        # Base URL of uploaded objects, computed once instead of on every upload
+        if self.endpoint:
+            # For custom endpoints (MinIO, etc.)
+            parsed_url = urlparse(self.endpoint)
+            self._base_url = f"{parsed_url.scheme}://{parsed_url.netloc}/{self.bucket_name}"
+        else:
+            # For AWS S3
+            self._base_url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com"
+        
         # Initialize S3 client
         self._initialize_client()
     
     def _initialize_client(self):
         """Initialize the S3 client with the provided credentials."""
+        # Larger connection pool with keep-alive and adaptive retries for concurrent uploads
+        config = Config(
+            max_pool_connections=32,
+            tcp_keepalive=True,
+            retries={'mode': 'adaptive', 'max_attempts': 5}
+        )
+        
+        self._client_kwargs = {
+            'aws_access_key_id': self.access_key,
+            'aws_secret_access_key': self.secret_key,
+            'region_name': self.region
+        }
+        
         # If endpoint is provided, use it (for MinIO, etc.)
         if self.endpoint:
-            self.client = boto3.client(
-                's3',
-                endpoint_url=self.endpoint,
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                region_name=self.region,
-                use_ssl=self.use_ssl
-            )
-        else:
-            # Use default AWS S3
-            self.client = boto3.client(
-                's3',
-                aws_access_key_id=self.access_key,
-                aws_secret_access_key=self.secret_key,
-                region_name=self.region
-            )
+            self._client_kwargs['endpoint_url'] = self.endpoint
+            self._client_kwargs['use_ssl'] = self.use_ssl
+        
+        self.client = boto3.client('s3', config=config, **self._client_kwargs)
         
-        # Create bucket if it doesn't exist
-        self._ensure_bucket_exists()
+        # Async client used for uploads on the I/O event loop, created on first use
+        self._async_client = None
+        self._async_client_context = None
+        self._async_client_pid = None
+        
+        # Reusable transfer manager for multipart uploads
+        self.transfer = S3Transfer(self.client, TRANSFER_CONFIG)
     
     def _ensure_bucket_exists(self):
         """Ensure the specified bucket exists, create it if it doesn't."""
@@ -95,32 +148,107 @@ class S3Client:
         
         # Upload the file
         try:
-            s3_logger.info(f"Uploading {file_path} to {self.bucket_name}/{object_name}")
-            self.client.upload_file(
-                file_path, 
-                self.bucket_name, 
-                object_name,
-                ExtraArgs=extra_args
-            )
+            s3_logger.debug(f"Uploading {file_path} to {self.bucket_name}/{object_name}")
+            if os.path.getsize(file_path) < PUT_OBJECT_MAX_SIZE:
+                # A single request avoids the transfer manager's thread setup
+                with open(file_path, 'rb') as f:
+                    self._put_object(object_name, f.read(), extra_args)
+            else:
+                self.transfer.upload_file(
+                    file_path,
+                    self.bucket_name,
+                    object_name,
+                    extra_args=extra_args
+                )
             
             # Generate URL for the uploaded file
             url = self._generate_url(object_name)
-            s3_logger.info(f"File uploaded successfully: {url}")
+            s3_logger.debug(f"File uploaded successfully: {url}")
             return url
         except ClientError as e:
             s3_logger.error(f"Error uploading file: {e}")
             raise
     
+    def upload_bytes(self, data, object_name, content_type=None):
+        """
+        Upload an in-memory buffer to S3 bucket.
+        
+        Args:
+            data (bytes): Content to upload
+            object_name (str): S3 object name
+            content_type (str, optional): Content type of the data
+            
+        Returns:
+            str: URL of the uploaded object
+        """
+        extra_args = {}
+        if content_type:
+            extra_args['ContentType'] = content_type
+        
+        try:
+            s3_logger.debug(f"Uploading {len(data)} bytes to {self.bucket_name}/{object_name}")
+            self._put_object(object_name, data, extra_args)
+            
+            url = self._generate_url(object_name)
+            s3_logger.debug(f"File uploaded successfully: {url}")
+            return url
+        except ClientError as e:
+            s3_logger.error(f"Error uploading file: {e}")
+            raise
+    
+    def _put_object(self, object_name, data, extra_args):
+        """
+        Put an object using the async client on the shared I/O event loop.
+        
+        Args:
+            object_name (str): S3 object name
+            data (bytes): Content to upload
+            extra_args (dict): Extra put_object arguments such as ContentType
+        """
+        io_loop.run(self._put_object_async(object_name, data, extra_args))
+    
+    async def _put_object_async(self, object_name, data, extra_args):
+        """Put an object with the async client."""
+        client = await self._get_async_client()
+        await client.put_object(
+            Bucket=self.bucket_name,
+            Key=object_name,
+            Body=data,
+            **extra_args
+        )
+    
+    async def _get_async_client(self):
+        """
+        Get or create the async S3 client for the current process.
+        Only called on the I/O event loop, so creation needs no lock.
+        
+        Returns:
+            aiobotocore S3 client
+        """
+        # A client inherited through fork belongs to the parent's loop and cannot be used here
+        if self._async_client is None or self._async_client_pid != os.getpid():
+            config = AioConfig(
+                max_pool_connections=32,
+                retries={'mode': 'adaptive', 'max_attempts': 5}
+            )
+            self._async_client_context = get_session().create_client('s3', config=config, **self._client_kwargs)
+            self._async_client = await self._async_client_context.__aenter__()
+            self._async_client_pid = os.getpid()
+        return self._async_client
+    
+    def close(self):
+        """Close the async client created by this process, releasing its connections."""
+        if self._async_client is None or self._async_client_pid != os.getpid():
+            return
+        
+        context = self._async_client_context
+        self._async_client = None
+        self._async_client_context = None
+        io_loop.run(context.__aexit__(None, None, None))
+    
     def _generate_url(self, object_name):
         """Generate a URL for the uploaded object."""
-        if self.endpoint:
-            # For custom endpoints (MinIO, etc.)
-            parsed_url = urlparse(self.endpoint)
-            base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-            return f"{base_url}/{self.bucket_name}/{object_name}"
-        else:
-            # For AWS S3
-            return f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{object_name}"
+        return f"{self._base_url}/{object_name}"
     
     def download_file(self, object_name, file_path):
         """
@@ -160,3 +288,11 @@ class S3Client:
         except ClientError as e:
             s3_logger.error(f"Error deleting file: {e}")
             return False
+
+def close_clients():
+    """Close the shared S3 clients of the current process."""
+    for instance in _client_instances.values():
+        try:
+            instance.close()
+        except Exception as e:
+            s3_logger.error(f"Error closing S3 client: {e}")
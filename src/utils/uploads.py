@@ -0,0 +1,93 @@
+import os
+import shutil
+from pathlib import Path
+from src.utils.s3 import S3Client
+from src.utils.events import get_redis_client
+from src.config import settings
+
+# Reference prefixes for uploads kept in shared storage
+S3_PREFIX = "s3://"
+REDIS_PREFIX = "redis://"
+
+# Local upload directory, resolved once
+UPLOAD_DIR = Path(settings.TEMP_UPLOAD_DIR)
+
+# Chunk size used when streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+def store_upload(source, filename):
+    """
+    Store an uploaded file according to the UPLOAD_STORAGE setting.
+    
+    Args:
+        source (file-like): Uploaded file object
+        filename (str): Unique filename for the stored upload
+        
+    Returns:
+        str: Reference to the stored upload (local path, s3:// or redis:// URI)
+    """
+    source.seek(0)
+    
+    if settings.UPLOAD_STORAGE == 's3':
+        s3_client = S3Client.get_instance()
+        key = f"uploads/{filename}"
+        s3_client.client.put_object(Bucket=s3_client.bucket_name, Key=key, Body=source)
+        return f"{S3_PREFIX}{s3_client.bucket_name}/{key}"
+    
+    if settings.UPLOAD_STORAGE == 'redis':
+        key = f"upload:{filename}"
+        get_redis_client().set(key, source.read(), ex=settings.UPLOAD_REDIS_TTL)
+        return f"{REDIS_PREFIX}{key}"
+    
+    # Default to the local upload directory
+    file_path = str(UPLOAD_DIR / filename)
+    with open(file_path, "wb") as buffer:
+        shutil.copyfileobj(source, buffer, UPLOAD_CHUNK_SIZE)
+    return file_path
+
+def fetch_upload(reference):
+    """
+    Fetch the contents of an upload kept in shared storage.
+    
+    Args:
+        reference (str): Reference returned by store_upload
+        
+    Returns:
+        bytes: Encoded image bytes, or None if the upload is a local file
+    """
+    if reference.startswith(S3_PREFIX):
+        bucket, key = reference[len(S3_PREFIX):].split('/', 1)
+        response = S3Client.get_instance().client.get_object(Bucket=bucket, Key=key)
+        return response['Body'].read()
+    
+    if reference.startswith(REDIS_PREFIX):
+        data = get_redis_client().get(reference[len(REDIS_PREFIX):])
+        if data is None:
+            raise FileNotFoundError(f"Upload {reference} does not exist or has expired")
+        return data
+    
+    return None
+
+def delete_upload(reference):
+    """
+    Delete a stored upload.
+    
+    Args:
+        reference (str): Reference returned by store_upload
+        
+    Returns:
+        bool: True if an upload was deleted, False otherwise
+    """
+    if reference.startswith(S3_PREFIX):
+        bucket, key = reference[len(S3_PREFIX):].split('/', 1)
+        S3Client.get_instance().client.delete_object(Bucket=bucket, Key=key)
+        return True
+    
+    if reference.startswith(REDIS_PREFIX):
+        return bool(get_redis_client().delete(reference[len(REDIS_PREFIX):]))
+    
+    try:
+        os.unlink(reference)
+        return True
+    except FileNotFoundError:
+        return False
@@ -16,7 +16,8 @@ app.conf.update(
     enable_utc=settings.CELERY_ENABLE_UTC,
     task_track_started=settings.CELERY_TASK_TRACK_STARTED,
     task_time_limit=settings.CELERY_TASK_TIME_LIMIT,
-    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY
+    worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
+    worker_pool=settings.CELERY_WORKER_POOL
 )
 
 # Import worker initialization module to register signal handlers
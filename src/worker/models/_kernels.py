@@ -0,0 +1,53 @@
+import threading
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Numba's default threading layer does not allow concurrent parallel calls
+_kernel_lock = threading.Lock()
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _bgr_to_chw_f32(src, dst):
+        """Convert a BGR uint8 HWC image to a normalized RGB float32 1xCxHxW tensor in one pass."""
+        height, width = src.shape[0], src.shape[1]
+        scale = np.float32(1.0 / 255.0)
+        for y in prange(height):
+            for x in range(width):
+                dst[0, 0, y, x] = src[y, x, 2] * scale
+                dst[0, 1, y, x] = src[y, x, 1] * scale
+                dst[0, 2, y, x] = src[y, x, 0] * scale
+
+def bgr_to_chw_f32(src):
+    """
+    Convert a resized BGR image to the model input layout.
+    
+    Args:
+        src (np.ndarray): BGR uint8 image with shape (H, W, 3)
+    
+    Returns:
+        np.ndarray: RGB float32 tensor scaled to [0, 1] with shape (1, 3, H, W)
+    """
+    dst = np.empty((1, 3, src.shape[0], src.shape[1]), dtype=np.float32)
+    with _kernel_lock:
+        _bgr_to_chw_f32(src, dst)
+    return dst
+
+def warmup(img_size):
+    """
+    Compile the kernels ahead of the first task.
+    
+    Args:
+        img_size (int): Model input size
+    
+    Returns:
+        bool: True if the kernels were compiled, False if Numba is not installed
+    """
+    if not NUMBA_AVAILABLE:
+        return False
+    bgr_to_chw_f32(np.zeros((img_size, img_size, 3), dtype=np.uint8))
+    return True
@@ -1,14 +1,67 @@
 import os
+import queue
+import threading
+import time
 import cv2
 import numpy as np
 import onnxruntime as ort
+from concurrent.futures import Future
 from PIL import Image
-import torch
+from src.worker.models.quantize import variant_path
+from src.worker.models import _kernels
+from src.utils.gpu import get_gpu_count
 from src.config.logging import model_logger
 from src.config import settings
 
 # Global variable to store the singleton model instances (one per worker)
 _model_instances = {}
+_model_instances_lock = threading.Lock()
+
+def cuda_available():
+    """
+    Check whether ONNX Runtime can run on CUDA.
+    
+    Returns:
+        bool: True if the CUDA execution provider is available
+    """
+    return 'CUDAExecutionProvider' in ort.get_available_providers()
+
+def to_uint8(img):
+    """
+    Convert an image of any bit depth to 8-bit, as IMREAD_COLOR would.
+    
+    Args:
+        img (np.ndarray): Image decoded with IMREAD_UNCHANGED (e.g. 16-bit PNG)
+        
+    Returns:
+        np.ndarray: 8-bit image, or img itself if it is already 8-bit
+    """
+    if img.dtype == np.uint8:
+        return img
+    
+    # Integer images use their full range, float images are expected in [0, 1]
+    if np.issubdtype(img.dtype, np.integer):
+        scale = 255.0 / np.iinfo(img.dtype).max
+    else:
+        scale = 255.0
+    return cv2.convertScaleAbs(img, alpha=scale)
+
+def mask_to_depth(mask, dtype):
+    """
+    Scale an 8-bit mask to the bit depth of the image it is applied to.
+    
+    Args:
+        mask (np.ndarray): uint8 mask with values in [0, 255]
+        dtype (np.dtype): Data type of the image channels
+        
+    Returns:
+        np.ndarray: Mask with the given dtype, 255 mapped to the full range
+    """
+    if dtype == np.uint8:
+        return mask
+    if np.issubdtype(dtype, np.integer):
+        return (mask.astype(np.float32) * (np.iinfo(dtype).max / 255.0)).astype(dtype)
+    return (mask.astype(np.float32) / 255.0).astype(dtype)
 
 class BackgroundRemovalModel:
     """AI model for removing backgrounds from images."""
@@ -27,11 +80,14 @@ class BackgroundRemovalModel:
         """
         global _model_instances
         if worker_id is None:
-            worker_id = 0  # Default worker ID
+            # Reuse the model preloaded for this process, if any
+            worker_id = next(iter(_model_instances), 0)
             
-        if worker_id not in _model_instances:
-            model_logger.info(f"Creating new model instance for worker {worker_id}")
-            _model_instances[worker_id] = cls(worker_id=worker_id, model_path=model_path)
+        # Tasks running in a threaded pool may ask for the model concurrently
+        with _model_instances_lock:
+            if worker_id not in _model_instances:
+                model_logger.info(f"Creating new model instance for worker {worker_id}")
+                _model_instances[worker_id] = cls(worker_id=worker_id, model_path=model_path)
         return _model_instances[worker_id]
     
     def __init__(self, worker_id=None, model_path=None):
@@ -46,9 +102,9 @@ class BackgroundRemovalModel:
         self.worker_id = worker_id or 0
         
         # Determine which GPU to use based on worker_id
-        if settings.DEVICE.lower() == 'cuda' and torch.cuda.is_available():
+        if settings.DEVICE.lower() == 'cuda' and cuda_available():
             # Get total available GPUs
-            num_gpus = torch.cuda.device_count()
+            num_gpus = get_gpu_count()
             if num_gpus > 0:
                 # Assign GPU based on worker_id (round-robin)
                 self.gpu_id = self.worker_id % num_gpus
@@ -62,7 +118,18 @@ class BackgroundRemovalModel:
             model_logger.info(f"Using CPU for worker {self.worker_id}")
             
         self.img_size = settings.IMG_SIZE
+        self.result_extension = f".{settings.RESULT_FORMAT}"
+        # The WebP encoder only accepts 8-bit images, PNG keeps the source depth
+        self.result_8bit = settings.RESULT_FORMAT == 'webp'
+        if settings.RESULT_FORMAT == 'webp':
+            # OpenCV switches WebP to lossless for quality above 100
+            self.encode_params = [cv2.IMWRITE_WEBP_QUALITY, 101]
+        else:
+            self.encode_params = [cv2.IMWRITE_PNG_COMPRESSION, settings.PNG_COMPRESSION]
         self._load_model()
+        
+        # Coalesce concurrent requests into batched inference calls
+        self.runner = BatchingInferenceRunner(self, self.batch_size, settings.BATCH_FLUSH_MS)
     
     def _load_model(self):
         """Load the ONNX model for inference."""
@@ -75,79 +142,199 @@ class BackgroundRemovalModel:
                 raise FileNotFoundError(f"Model file not found: {self.model_path}")
             
             # Configure ONNX runtime session
-            if self.device.startswith('cuda') and torch.cuda.is_available():
+            use_cuda_graph = False
+            use_cuda = self.device.startswith('cuda')
+            model_path = self._select_model_path(use_cuda)
+            if use_cuda:
                 gpu_id = int(self.device.split(':')[1]) if ':' in self.device else 0
                 model_logger.info(f"Using CUDA device {gpu_id} for inference")
-                # Set environment variable for CUDA device
-                os.environ['CUDA_VISIBLE_DEVICES'] = str(gpu_id)
+                # The input shape is fixed, so the whole run can be replayed as a CUDA graph
+                use_cuda_graph = settings.CUDA_GRAPH_ENABLED
+                cuda_options = {
+                    'device_id': gpu_id,
+                    'arena_extend_strategy': 'kSameAsRequested',
+                    'cudnn_conv_algo_search': 'EXHAUSTIVE',
+                    'do_copy_in_default_stream': '1',
+                    'enable_cuda_graph': '1' if use_cuda_graph else '0'
+                }
                 providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
-                provider_options = [{'device_id': gpu_id}, {}]
+                provider_options = [cuda_options, {}]
+                
+                # Let TensorRT take the subgraphs it supports, in FP16, ahead of CUDA
+                if settings.TENSORRT_ENABLED and 'TensorrtExecutionProvider' in ort.get_available_providers():
+                    model_logger.info("Using TensorRT execution provider with FP16")
+                    providers.insert(0, 'TensorrtExecutionProvider')
+                    provider_options.insert(0, {
+                        'device_id': gpu_id,
+                        'trt_fp16_enable': True,
+                        'trt_engine_cache_enable': True,
+                        'trt_engine_cache_path': settings.TENSORRT_CACHE_DIR
+                    })
+                    
+                    # CUDA graphs need every node on the CUDA provider, which TensorRT takes over
+                    if use_cuda_graph:
+                        model_logger.warning("CUDA graph capture is not supported with TensorRT, disabling it")
+                        use_cuda_graph = False
+                        cuda_options['enable_cuda_graph'] = '0'
             else:
                 model_logger.info("Using CPU for inference")
                 providers = ['CPUExecutionProvider']
                 provider_options = [{}]
             
+            session_options = ort.SessionOptions()
+            session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session_options.enable_mem_pattern = True
+            
             # Create ONNX runtime session
-            self.session = ort.InferenceSession(
-                self.model_path, 
-                providers=providers,
-                provider_options=provider_options
-            )
+            try:
+                self.session = ort.InferenceSession(
+                    model_path, 
+                    sess_options=session_options,
+                    providers=providers,
+                    provider_options=provider_options
+                )
+            except Exception as e:
+                if not use_cuda_graph:
+                    raise
+                # Capture fails when any node is placed outside the CUDA provider
+                model_logger.warning(f"CUDA graph capture not supported by this model, loading without it: {e}")
+                use_cuda_graph = False
+                cuda_options['enable_cuda_graph'] = '0'
+                self.session = ort.InferenceSession(
+                    model_path, 
+                    sess_options=session_options,
+                    providers=providers,
+                    provider_options=provider_options
+                )
             
             # Get model metadata
             self.input_name = self.session.get_inputs()[0].name
             self.output_name = self.session.get_outputs()[0].name
             
+            # Respect a batch dimension fixed by the model, otherwise use BATCH_SIZE
+            batch_dim = self.session.get_inputs()[0].shape[0]
+            self.batch_size = batch_dim if isinstance(batch_dim, int) else max(settings.BATCH_SIZE, 1)
+            
+            # Bind a persistent GPU input buffer so each image reuses the same device memory
+            self.io_binding = None
+            if 'CUDAExecutionProvider' in self.session.get_providers():
+                # Batches are padded to batch_size so the bound shapes never change
+                input_shape = [self.batch_size, 3, self.img_size, self.img_size]
+                self.input_buffer = np.zeros(input_shape, dtype=np.float32)
+                self.input_ortvalue = ort.OrtValue.ortvalue_from_shape_and_type(
+                    input_shape, np.float32, 'cuda', gpu_id
+                )
+                self.io_binding = self.session.io_binding()
+                self.io_binding.bind_ortvalue_input(self.input_name, self.input_ortvalue)
+                if use_cuda_graph:
+                    # CUDA graphs replay fixed addresses, so the output buffer must be preallocated too
+                    self.output_ortvalue = ort.OrtValue.ortvalue_from_shape_and_type(
+                        self._output_shape(), np.float32, 'cuda', gpu_id
+                    )
+                    self.io_binding.bind_ortvalue_output(self.output_name, self.output_ortvalue)
+                else:
+                    self.io_binding.bind_output(self.output_name, 'cuda', gpu_id)
+                model_logger.info(f"Using IO binding on CUDA device {gpu_id}")
+            
             model_logger.info(f"Model loaded successfully for worker {self.worker_id}")
         except Exception as e:
             model_logger.error(f"Failed to load model for worker {self.worker_id}: {e}")
             raise
     
-    def preprocess(self, image_path):
+    def _select_model_path(self, use_cuda):
         """
-        Preprocess the input image for the model.
+        Choose the model variant for the device.
+        
+        With MODEL_PRECISION=auto, GPUs use the FP16 variant and CPUs the INT8
+        variant when they have been exported next to MODEL_PATH.
+        
+        Args:
+            use_cuda (bool): Whether the model runs on a CUDA device
+            
+        Returns:
+            str: Path to the ONNX model to load
+        """
+        precision = settings.MODEL_PRECISION
+        if precision == 'auto':
+            precision = 'fp16' if use_cuda else 'int8'
+        if precision == 'fp32':
+            return self.model_path
+        
+        path = variant_path(self.model_path, precision)
+        if not os.path.exists(path):
+            model_logger.info(f"{precision} model not found at {path}, using {self.model_path}")
+            return self.model_path
+        
+        model_logger.info(f"Using {precision} model {path}")
+        return path
+    
+    def _output_shape(self):
+        """
+        Get the model output shape, filling symbolic dimensions from the fixed input size.
+        
+        Returns:
+            list: Output shape
+        """
+        defaults = [self.batch_size, 1, self.img_size, self.img_size]
+        shape = self.session.get_outputs()[0].shape
+        return [
+            dim if isinstance(dim, int) else default
+            for dim, default in zip(shape, defaults)
+        ]
+    
+    def read_image(self, image_path, image_data=None, flags=cv2.IMREAD_COLOR):
+        """
+        Read an image from disk or decode it from encoded bytes.
         
         Args:
             image_path (str): Path to the input image
+            image_data (bytes, optional): Encoded image bytes, used instead of reading image_path
+            flags (int, optional): OpenCV imread flags
+            
+        Returns:
+            np.ndarray: Decoded image, or None if it could not be read
+        """
+        if image_data is not None:
+            return cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flags)
+        return cv2.imread(image_path, flags)
+    
+    def preprocess(self, img):
+        """
+        Preprocess the input image for the model.
+        
+        Args:
+            img (np.ndarray): Decoded BGR image
             
         Returns:
             np.ndarray: Preprocessed image
         """
         try:
-            # Read image
-            img = cv2.imread(image_path)
-            if img is None:
-                raise ValueError(f"Failed to read image: {image_path}")
-            
-            # Convert BGR to RGB
-            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Save original size for later
-            self.orig_h, self.orig_w = img.shape[:2]
-            
-            # Resize image
-            img = cv2.resize(img, (self.img_size, self.img_size))
+            # Use the fused Numba kernel for the layout conversion when it is installed
+            if _kernels.NUMBA_AVAILABLE:
+                img = cv2.resize(img, (self.img_size, self.img_size))
+                return _kernels.bgr_to_chw_f32(img)
             
-            # Normalize image
-            img = img.astype(np.float32) / 255.0
-            
-            # Transpose from HWC to CHW format
-            img = img.transpose(2, 0, 1)
-            
-            # Add batch dimension
-            img = np.expand_dims(img, axis=0)
+            # Resize, convert BGR to RGB, normalize and lay out as NCHW in a single pass
+            blob = cv2.dnn.blobFromImage(
+                img,
+                scalefactor=1 / 255.0,
+                size=(self.img_size, self.img_size),
+                swapRB=True,
+                crop=False
+            )
             
-            return img
+            return blob
         except Exception as e:
             model_logger.error(f"Error preprocessing image: {e}")
             raise
     
-    def postprocess(self, output, threshold=0.5):
+    def postprocess(self, output, size, threshold=0.5):
         """
         Postprocess the model output to get the alpha mask.
         
         Args:
             output (np.ndarray): Model output
+            size (tuple): Original image size as (height, width)
             threshold (float, optional): Threshold for binary mask
             
         Returns:
@@ -156,19 +343,92 @@ class BackgroundRemovalModel:
         try:
             # Get the mask from output
             mask = output[0][0]
+            orig_h, orig_w = size
             
-            # Resize mask to original image size
-            mask = cv2.resize(mask, (self.orig_w, self.orig_h))
+            if settings.MASK_RESIZE_LINEAR:
+                # Resize the soft mask before thresholding for smoother edges
+                mask = cv2.resize(mask, (orig_w, orig_h))
+                return (mask > threshold).astype(np.uint8) * 255
             
-            # Apply threshold to get binary mask
+            # Threshold at model resolution, then upscale the binary mask
             mask = (mask > threshold).astype(np.uint8) * 255
-            
-            return mask
+            return cv2.resize(mask, (orig_w, orig_h), interpolation=cv2.INTER_NEAREST)
         except Exception as e:
             model_logger.error(f"Error postprocessing output: {e}")
             raise
     
-    def remove_background(self, image_path, output_path, alpha_output_path=None, threshold=0.5):
+    def run_inference(self, input_tensor):
+        """
+        Run the model on a batch of preprocessed input tensors.
+        Not thread-safe; concurrent callers should go through self.runner.
+        
+        Args:
+            input_tensor (np.ndarray): Preprocessed images with shape (n, 3, img_size, img_size), n <= batch_size
+            
+        Returns:
+            np.ndarray: Model output for the n images
+        """
+        if self.io_binding is None:
+            return self.session.run([self.output_name], {self.input_name: input_tensor})[0]
+        
+        # Copy into the bound device buffer instead of allocating a new one.
+        # Rows past n hold stale data, their outputs are discarded.
+        count = input_tensor.shape[0]
+        self.input_buffer[:count] = input_tensor
+        self.input_ortvalue.update_inplace(self.input_buffer)
+        self.session.run_with_iobinding(self.io_binding)
+        return self.io_binding.copy_outputs_to_cpu()[0][:count]
+    
+    def _remove_background(self, image_path, alpha_output_path=None, threshold=0.5, image_data=None):
+        """
+        Remove background from an image.
+        
+        Args:
+            image_path (str): Path to the input image
+            alpha_output_path (str, optional): Path to save the alpha mask
+            threshold (float, optional): Threshold for binary mask
+            image_data (bytes, optional): Encoded image bytes, used instead of reading image_path
+            
+        Returns:
+            np.ndarray: BGRA image with the mask in its alpha channel
+        """
+        model_logger.debug(f"Processing image: {image_path} on {self.device}")
+        
+        # Decode the image once and reuse it for both the model input and the result
+        original_img = self.read_image(image_path, image_data, cv2.IMREAD_UNCHANGED)
+        if original_img is None:
+            raise ValueError(f"Failed to read image: {image_path}")
+        
+        # Get the BGR channels used as model input
+        if original_img.ndim == 2:
+            original_img = cv2.cvtColor(original_img, cv2.COLOR_GRAY2BGR)
+        has_alpha = original_img.shape[2] == 4
+        color_img = original_img[:, :, :3] if has_alpha else original_img
+        
+        # Preprocess image, the model expects 8-bit input whatever the source depth
+        input_tensor = self.preprocess(to_uint8(color_img))
+        
+        # Run inference
+        model_logger.debug(f"Running inference on {self.device}")
+        output = self.runner.submit(input_tensor).result()
+        
+        # Postprocess output
+        mask = self.postprocess(output, original_img.shape[:2], threshold)
+        
+        # Save alpha mask if requested
+        if alpha_output_path:
+            cv2.imwrite(alpha_output_path, mask)
+            model_logger.debug(f"Alpha mask saved to {alpha_output_path}")
+        
+        # Apply mask to alpha channel, writing it in place when the image already has one.
+        # The alpha plane must match the depth of the colour planes (e.g. 16-bit PNG).
+        mask = mask_to_depth(mask, original_img.dtype)
+        if has_alpha:
+            original_img[:, :, 3] = mask
+            return original_img
+        return cv2.merge((*cv2.split(color_img), mask))
+    
+    def remove_background(self, image_path, output_path, alpha_output_path=None, threshold=0.5, image_data=None):
         """
         Remove background from an image and save the result.
         
@@ -177,43 +437,126 @@ class BackgroundRemovalModel:
             output_path (str): Path to save the output image (RGB)
             alpha_output_path (str, optional): Path to save the alpha mask
             threshold (float, optional): Threshold for binary mask
+            image_data (bytes, optional): Encoded image bytes, used instead of reading image_path
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            model_logger.info(f"Processing image: {image_path} on {self.device}")
+            result_img = self._remove_background(image_path, alpha_output_path, threshold, image_data)
+            if self.result_8bit:
+                result_img = to_uint8(result_img)
             
-            # Preprocess image
-            input_tensor = self.preprocess(image_path)
-            
-            # Run inference
-            model_logger.info(f"Running inference on {self.device}")
-            outputs = self.session.run([self.output_name], {self.input_name: input_tensor})
+            # Save result
+            cv2.imwrite(output_path, result_img, self.encode_params)
+            model_logger.debug(f"Result saved to {output_path}")
             
-            # Postprocess output
-            mask = self.postprocess(outputs[0], threshold)
+            return True
+        except Exception as e:
+            model_logger.error(f"Error removing background: {e}")
+            return False
+    
+    def remove_background_to_bytes(self, image_path, alpha_output_path=None, threshold=0.5, image_data=None):
+        """
+        Remove background from an image and encode the result in memory.
+        
+        Args:
+            image_path (str): Path to the input image
+            alpha_output_path (str, optional): Path to save the alpha mask
+            threshold (float, optional): Threshold for binary mask
+            image_data (bytes, optional): Encoded image bytes, used instead of reading image_path
             
-            # Save alpha mask if requested
-            if alpha_output_path:
-                cv2.imwrite(alpha_output_path, mask)
-                model_logger.info(f"Alpha mask saved to {alpha_output_path}")
+        Returns:
+            bytes: Result encoded in RESULT_FORMAT, or None if processing failed
+        """
+        try:
+            result_img = self._remove_background(image_path, alpha_output_path, threshold, image_data)
+            if self.result_8bit:
+                result_img = to_uint8(result_img)
             
-            # Apply mask to original image
-            original_img = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
+            ok, buffer = cv2.imencode(self.result_extension, result_img, self.encode_params)
+            if not ok:
+                raise ValueError("Failed to encode result image")
             
-            # Check if image has alpha channel, if not add one
-            if original_img.shape[2] == 3:
-                original_img = cv2.cvtColor(original_img, cv2.COLOR_BGR2BGRA)
+            return buffer.tobytes()
+        except Exception as e:
+            model_logger.error(f"Error removing background: {e}")
+            return None
+
+class BatchingInferenceRunner:
+    """Runs inference for concurrent callers in batches on a background thread."""
+    
+    def __init__(self, model, max_batch_size, flush_interval_ms=10):
+        """
+        Initialize the batching runner.
+        
+        Args:
+            model (BackgroundRemovalModel): Model whose run_inference is called with each batch
+            max_batch_size (int): Maximum number of images per inference call
+            flush_interval_ms (int, optional): How long to wait for more images before running a partial batch
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+    
+    def submit(self, input_tensor):
+        """
+        Queue a preprocessed image for inference.
+        
+        Args:
+            input_tensor (np.ndarray): Preprocessed image with shape (1, 3, img_size, img_size)
             
-            # Apply mask to alpha channel
-            original_img[:, :, 3] = mask
+        Returns:
+            concurrent.futures.Future: Future resolving to the model output for the image
+        """
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((input_tensor, future))
+        return future
+    
+    def _ensure_thread(self):
+        """Start the inference thread for this process if it is not running."""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run,
+                    name="inference-batcher",
+                    daemon=True
+                )
+                self._thread.start()
+    
+    def _run(self):
+        """Collect queued images into batches and run them through the model."""
+        while True:
+            batch = [self._queue.get()]
             
-            # Save result
-            cv2.imwrite(output_path, original_img)
-            model_logger.info(f"Result saved to {output_path}")
+            # Wait up to the flush interval for more images to arrive
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
             
-            return True
+            self._run_batch(batch)
+    
+    def _run_batch(self, batch):
+        """Run one batch and resolve the futures of its images."""
+        try:
+            inputs = np.concatenate([input_tensor for input_tensor, _ in batch])
+            outputs = self.model.run_inference(inputs)
+            if len(batch) > 1:
+                model_logger.info(f"Ran inference on a batch of {len(batch)} images")
         except Exception as e:
-            model_logger.error(f"Error removing background: {e}")
-            return False
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        for index, (_, future) in enumerate(batch):
+            future.set_result(outputs[index:index + 1])
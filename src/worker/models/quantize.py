@@ -0,0 +1,62 @@
+import argparse
+from pathlib import Path
+from src.config import settings
+
+def variant_path(model_path, precision):
+    """
+    Get the path of a reduced-precision model variant.
+    
+    Args:
+        model_path (str): Path to the FP32 ONNX model
+        precision (str): Model precision ('fp16' or 'int8')
+    
+    Returns:
+        str: Path of the variant, next to the FP32 model (e.g. models/u2net_fp16.onnx)
+    """
+    path = Path(model_path)
+    return str(path.with_name(f"{path.stem}_{precision}{path.suffix}"))
+
+def export_fp16(model_path, output_path):
+    """
+    Convert an FP32 ONNX model to FP16 for GPU inference.
+    Inputs and outputs stay FP32, so callers feed the same tensors as before.
+    
+    Args:
+        model_path (str): Path to the FP32 ONNX model
+        output_path (str): Path to save the FP16 model
+    """
+    import onnx
+    from onnxconverter_common import float16
+    
+    model = onnx.load(model_path)
+    model = float16.convert_float_to_float16(model, keep_io_types=True)
+    onnx.save(model, output_path)
+
+def export_int8(model_path, output_path):
+    """
+    Quantize the weights of an ONNX model to INT8 for CPU inference.
+    
+    Args:
+        model_path (str): Path to the FP32 ONNX model
+        output_path (str): Path to save the INT8 model
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+
+def main():
+    """Export the reduced-precision model variants."""
+    parser = argparse.ArgumentParser(description="Export FP16/INT8 variants of the ONNX model")
+    parser.add_argument("--model", default=settings.MODEL_PATH, help="Path to the FP32 ONNX model")
+    parser.add_argument("--precision", choices=["fp16", "int8", "all"], default="all", help="Variant to export")
+    args = parser.parse_args()
+    
+    exporters = {"fp16": export_fp16, "int8": export_int8}
+    precisions = list(exporters) if args.precision == "all" else [args.precision]
+    for precision in precisions:
+        output_path = variant_path(args.model, precision)
+        print(f"Exporting {precision} model to {output_path}")
+        exporters[precision](args.model, output_path)
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,16 @@ from src.worker.celery_app import app
 from src.worker.models.bg_removal import BackgroundRemovalModel
 from src.utils.s3 import S3Client
 from src.utils.callbacks import CallbackClient
+from src.utils.uploads import fetch_upload, delete_upload
 from src.config.logging import worker_logger
 from src.config import settings
 
+# Content types of the supported result formats
+RESULT_CONTENT_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp'
+}
+
 @app.task(bind=True, name='remove_background')
 def remove_background(self, image_path, original_filename=None, callback_data=None, creation_time=None):
     """
@@ -17,7 +24,7 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
     
     Args:
         self: Task instance
-        image_path (str): Path to the input image
+        image_path (str): Reference to the input image (local path, s3:// or redis:// URI)
         original_filename (str, optional): Original filename of the uploaded image
         callback_data (dict, optional): Additional data to include in callback
         creation_time (float, optional): Timestamp when the task was created
@@ -34,15 +41,14 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
     worker_logger.info(f"Starting background removal task {task_id} for image {image_path} (queue wait: {queue_time}s)")
     
     # Initialize clients
-    s3_client = S3Client()
-    callback_client = CallbackClient()
+    callback_client = CallbackClient.get_instance()
     
     # Update task state to STARTED
     self.update_state(state=states.STARTED, meta={'status': 'processing'})
     
     # Send callback for processing status
-    if callback_data:
-        callback_client.send_callback(
+    if callback_data and settings.CALLBACK_ENABLED:
+        callback_client.send_callback_async(
             task_id=task_id,
             status='processing',
             **callback_data
@@ -57,39 +63,50 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
         timestamp = int(time.time())
         unique_id = str(uuid.uuid4())[:8]
         
-        output_filename = f"{filename_without_ext}_nobg_{timestamp}_{unique_id}.png"
+        output_filename = f"{filename_without_ext}_nobg_{timestamp}_{unique_id}.{settings.RESULT_FORMAT}"
         output_path = os.path.join(settings.RESULT_DIR, output_filename)
         
         # Get the singleton model instance instead of creating a new one
         model = BackgroundRemovalModel.get_instance()
         
-        # Process image
-        worker_logger.info(f"Processing image {image_path} with model")
+        # Fetch the image if it was stored in S3 or Redis
+        image_data = fetch_upload(image_path)
+        
+        # Check if S3 credentials are configured
+        result_url = None
+        s3_configured = settings.S3_ACCESS_KEY and settings.S3_SECRET_KEY
+        
+        # Process image, keeping the result in memory when it goes straight to S3
+        worker_logger.debug(f"Processing image {image_path} with model")
         model_start_time = time.time()  # 记录模型处理开始时间
-        success = model.remove_background(
-            image_path=image_path,
-            output_path=output_path
-        )
+        if s3_configured:
+            result_data = model.remove_background_to_bytes(
+                image_path=image_path,
+                image_data=image_data
+            )
+            success = result_data is not None
+        else:
+            success = model.remove_background(
+                image_path=image_path,
+                output_path=output_path,
+                image_data=image_data
+            )
         model_processing_time = time.time() - model_start_time  # 计算模型处理时间
         
         if not success:
             raise Exception("Failed to process image with model")
         
-        # Check if S3 credentials are configured
-        result_url = None
-        s3_configured = settings.S3_ACCESS_KEY and settings.S3_SECRET_KEY
-        
         if s3_configured:
             # Upload result to S3
-            worker_logger.info(f"Uploading result to S3: {output_path}")
-            result_url = s3_client.upload_file(
-                file_path=output_path,
+            worker_logger.debug(f"Uploading result to S3: results/{output_filename}")
+            result_url = S3Client.get_instance().upload_bytes(
+                data=result_data,
                 object_name=f"results/{output_filename}",
-                content_type="image/png"
+                content_type=RESULT_CONTENT_TYPES[settings.RESULT_FORMAT]
             )
         else:
             # For local development, just use the local file path
-            worker_logger.info(f"S3 not configured, using local file path: {output_path}")
+            worker_logger.debug(f"S3 not configured, using local file path: {output_path}")
             result_url = f"file://{output_path}"
         
         # 计算总处理时间
@@ -106,8 +123,8 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
             'queue_time': queue_time  # 队列等待时间（秒）
         }
         
-        if callback_data:
-            callback_client.send_callback(
+        if callback_data and settings.CALLBACK_ENABLED:
+            callback_client.send_callback_async(
                 task_id=task_id,
                 status='completed',
                 result_url=result_url,
@@ -128,8 +145,8 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
         error_time = time.time() - start_time
         
         # Send failure callback
-        if callback_data:
-            callback_client.send_callback(
+        if callback_data and settings.CALLBACK_ENABLED:
+            callback_client.send_callback_async(
                 task_id=task_id,
                 status='failed',
                 error=error_message,
@@ -151,13 +168,15 @@ def remove_background(self, image_path, original_filename=None, callback_data=No
     finally:
         # Clean up temporary files
         try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-                worker_logger.info(f"Removed temporary input file: {image_path}")
+            if delete_upload(image_path):
+                worker_logger.debug(f"Removed temporary input file: {image_path}")
             
             # Don't remove output file in local development mode
-            # if 'output_path' in locals() and os.path.exists(output_path):
-            #    os.remove(output_path)
-            #    worker_logger.info(f"Removed temporary output file: {output_path}")
+            # if 'output_path' in locals():
+            #    try:
+            #        os.unlink(output_path)
+            #        worker_logger.debug(f"Removed temporary output file: {output_path}")
+            #    except FileNotFoundError:
+            #        pass
         except Exception as e:
             worker_logger.error(f"Error cleaning up temporary files: {e}")
@@ -1,7 +1,14 @@
-from celery.signals import worker_init, worker_process_init
+from celery import states
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, task_prerun, task_postrun
 from src.worker.models.bg_removal import BackgroundRemovalModel
-from src.config.logging import worker_logger
-import os
+from src.worker.models import _kernels
+from src.utils.s3 import S3Client, close_clients
+from src.utils.callbacks import close_client as close_callback_client
+from src.config import settings
+from src.utils.events import publish_task_event
+from src.utils.gpu import pin_gpu
+from src.config.logging import worker_logger, stop_log_listener
+from billiard.process import current_process
 
 @worker_process_init.connect
 def init_worker_process(**kwargs):
@@ -9,36 +16,84 @@ def init_worker_process(**kwargs):
     Initialize resources when each worker process starts.
     This is called for each worker process (based on concurrency setting).
     """
-    # Get worker ID from environment variable or process ID
+    # Get a stable index for this pool process
     worker_id = get_worker_id()
     worker_logger.info(f"Initializing worker process {worker_id} - preloading model to GPU")
     
+    # Pin the process to one GPU before the model creates a CUDA context
+    if settings.DEVICE.lower() == 'cuda':
+        gpu = pin_gpu(worker_id)
+        if gpu is not None:
+            worker_logger.info(f"Worker {worker_id} pinned to GPU {gpu}")
+    
+    # Compile the preprocessing kernels before the first task needs them
+    if _kernels.warmup(settings.IMG_SIZE):
+        worker_logger.info(f"Preprocessing kernels compiled for worker {worker_id}")
+    
     # Preload model to GPU with specific worker ID
     BackgroundRemovalModel.get_instance(worker_id=worker_id)
     worker_logger.info(f"Model preloaded successfully for worker {worker_id}")
+    
+    # Create the shared S3 client and check the bucket once per process
+    if settings.S3_ACCESS_KEY and settings.S3_SECRET_KEY:
+        S3Client.get_instance()
+        worker_logger.info(f"S3 client initialized for worker {worker_id}")
+
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    """
+    Release resources when a worker process exits.
+    Pool processes end with os._exit(), which skips atexit handlers.
+    """
+    worker_logger.info(f"Shutting down worker process {get_worker_id()}")
+    
+    # Deliver callbacks still queued or in flight, including the last tasks' final status
+    close_callback_client()
+    
+    # Close the async S3 client and its connection pool on the I/O loop
+    close_clients()
+    
+    # Flush queued log records last so messages from the steps above are kept
+    stop_log_listener()
+
+@worker_init.connect
+def init_threaded_worker(**kwargs):
+    """
+    Initialize resources in the main process when tasks run in a thread pool.
+    worker_process_init is only sent to prefork child processes.
+    """
+    if settings.CELERY_WORKER_POOL == 'threads':
+        init_worker_process()
+
+@task_prerun.connect
+def publish_task_started(task_id=None, **kwargs):
+    """Publish a STARTED event when a task begins executing."""
+    publish_task_event(task_id, states.STARTED)
+
+@task_postrun.connect
+def publish_task_finished(task_id=None, retval=None, state=None, **kwargs):
+    """
+    Publish the final state of a task.
+    This runs after the result has been stored in the result backend.
+    """
+    if isinstance(retval, Exception):
+        retval = {"error": str(retval)}
+    publish_task_event(task_id, state, retval)
 
 def get_worker_id():
     """
-    Get the worker ID from environment variables or generate one based on process ID.
+    Get a stable index for the current worker process.
+    
+    Prefork pool processes keep their index when they are replaced, so the
+    same index maps to the same GPU for the lifetime of the worker.
     
     Returns:
-        int: Worker ID
-    """
-    # Try to get worker ID from Celery worker name
-    worker_name = os.environ.get('CELERY_WORKER_NAME', '')
-    if worker_name:
-        # Extract worker number from name (e.g., "worker1" -> 1)
-        try:
-            worker_id = int(''.join(filter(str.isdigit, worker_name)))
-            return worker_id
-        except ValueError:
-            pass
-    
-    # Try to get worker ID from process ID (fallback)
-    try:
-        # Use last digit of process ID as worker ID
-        worker_id = os.getpid() % 10
-        return worker_id
-    except:
-        # Default to 0 if all else fails
-        return 0
+        int: Zero-based process index, 0 outside a pool process
+    """
+    process = current_process()
+    index = getattr(process, 'index', None)
+    if index is not None:
+        return index
+    
+    identity = getattr(process, '_identity', ())
+    return identity[0] - 1 if identity else 0